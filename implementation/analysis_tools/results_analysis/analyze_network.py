@@ -45,7 +45,7 @@ def all_detection_methods(graph, param=None, path=None):
         
     all_info = CD.expand_all(graph, seeds, param[4], param[6])
     communities = all_info[0]
-    found['Parallel Communities'] = [c.nodes.keys() for c in communities]
+    found['Parallel Communities'] = [list(c) for c in communities]
     print "Finished Parallel"
     
     # Find the communities from Metris
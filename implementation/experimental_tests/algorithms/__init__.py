@@ -2,6 +2,10 @@
 
 from clique_distribution import *
 from local_ball_detection import *
+from parallel_linearity import *
+from parallel_louvain import *
 
 import clique_distribution
-import local_ball_detection
\ No newline at end of file
+import local_ball_detection
+import parallel_linearity
+import parallel_louvain
\ No newline at end of file
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import CommunityDetection as CD
+import time
+
+
+def linearity_scaling(graph, __A, __B, __C, max_workers, tolerance=0.05):
+    """Times linearity_run with parallel shell games from 1 to max_workers
+    
+    Parameters
+    ----------
+    graph : a networkx graph, with a 'size' for each node and a 'weight' for
+            each edge
+    a, b, c : the weightings of the linearity metric
+    max_workers : the largest number of worker processes to try
+    tolerance : the relative difference of the metric to the sequential one
+                over which a run is reported as disagreeing
+    
+    Returns
+    -------
+    report : a list of (workers, seconds, lin_metric, speedup), where workers
+             None is the sequential shell game and speedup is relative to it
+    """
+    report = []
+    for workers in [None] + range(1, max_workers + 1):
+        start = time.time()
+        part = CD.linearity_run(graph, __A, __B, __C, engine="array",
+                                workers=workers)
+        seconds = time.time() - start
+        lin = partition_lin_metric(graph, part, __A, __B, __C)
+        report.append((workers, seconds, lin))
+        
+    base = report[0][1]
+    base_lin = report[0][2]
+    report = [(w, s, l, base / s) for (w, s, l) in report]
+    for (workers, seconds, lin, speedup) in report:
+        print "workers:", workers, " seconds:", seconds, \
+              " lin_metric:", lin, " speedup:", speedup
+        if abs(lin - base_lin) > tolerance * abs(base_lin):
+            print "    ***lin_metric differs from the sequential one.***"
+              
+    return report
+    
+    
+def partition_lin_metric(graph, partition, __A, __B, __C):
+    """Returns the linearity metric of a partition of the graph
+    """
+    bar = CD.ArrayBar(graph, 2. * graph.number_of_edges(), __A, __B, __C)
+    first = {}
+    for n in graph:
+        b = first.setdefault(partition[n], n)
+        if b != n:
+            bar.swap(graph, n, n, b)
+            
+    return bar.lin_metric()
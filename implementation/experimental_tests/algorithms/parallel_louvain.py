@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+import CommunityDetection as CD
+import time
+
+
+def louvain_scaling(graph, max_workers, tolerance=0.05):
+    """Times the parallel Louvain local moves from 1 to max_workers processes
+    
+    Parameters
+    ----------
+    graph : a networkx graph
+    max_workers : the largest number of worker processes to try
+    tolerance : the relative difference of the modularity to the sequential
+                one over which a run is reported as disagreeing
+    
+    Returns
+    -------
+    report : a list of (workers, seconds, modularity, speedup), where workers
+             None is the sequential engine and speedup is relative to it
+    """
+    modularity = CD.modularity_communities.modularity
+    report = []
+    for workers in [None] + range(1, max_workers + 1):
+        start = time.time()
+        part = CD.modularity_run(graph, engine="csr", workers=workers)
+        seconds = time.time() - start
+        report.append((workers, seconds, modularity(part, graph)))
+        
+    base = report[0][1]
+    base_mod = report[0][2]
+    report = [(w, s, m, base / s) for (w, s, m) in report]
+    for (workers, seconds, mod, speedup) in report:
+        print "workers:", workers, " seconds:", seconds, \
+              " modularity:", mod, " speedup:", speedup
+        if abs(mod - base_mod) > tolerance * abs(base_mod):
+            print "    ***modularity differs from the sequential one.***"
+              
+    return report
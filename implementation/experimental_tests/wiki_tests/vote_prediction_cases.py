@@ -12,7 +12,7 @@ def run_all_wiki(preknowledge=False):
     
     seeds = CD.weighted_seeds(wgraph, .49, 2)
     communities = CD.expand_all(wgraph, seeds, 20, 300)
-    community_nodes = [c.nodes.keys() for c in communities[0]]
+    community_nodes = [list(c) for c in communities[0]]
     
     pf = open('05_communities.pkl', 'wb')
     pickle.dump(['Communities produced by expanding weighted seeds',
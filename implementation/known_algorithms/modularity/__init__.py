@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from modularity_arrays import *
 from modularity_communities import *
 
+import modularity_arrays
 import modularity_communities
\ No newline at end of file
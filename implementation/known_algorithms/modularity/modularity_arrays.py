@@ -0,0 +1,1254 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+This module implements the Louvain heuristic on a CSR form of the graph.
+
+Nodes are relabelled to the contiguous ints 0..n-1 once, in graph.nodes()
+order, the adjacency is kept as the NumPy arrays (indptr, indices, weights)
+and the status of the algorithm is kept in flat arrays indexed by node or
+community id.  The dendogram returned has the same format as the one of
+generate_dendogram, so partition_at_level and modularity_run work on it.
+"""
+__all__ = ["graph_to_csr", "csr_to_edges", "score_partitions",
+           "load_binary_csr", "induced_csr", "color_classes",
+           "generate_dendogram_arrays", "generate_dendogram_csr",
+           "incremental_dendogram", "resolution_sweep",
+           "consensus_partition", "coassignment_csr", "ArrayStatus",
+           "ArrayDendogram", "load_dendogram"]
+
+__PASS_MAX = -1
+__MIN = 0.0000001
+__PARALLEL_MIN = 10000
+
+import itertools
+import multiprocessing
+import networkx as nx
+import numpy as np
+
+
+def graph_to_csr(graph, dtype = np.float64) :
+    """Relabel the nodes of graph to 0..n-1 and build its CSR adjacency
+
+    Every undirected edge (u, v) is stored in the rows of u and v, a self
+    loop is stored once in the row of its node, as in graph[node].
+
+    Parameters
+    ----------
+    graph : networkx.Graph
+       the networkx graph, edges without a 'weight' have weight 1
+    dtype : numpy.dtype, optionnal
+       the dtype of weights, None to keep that of the weights of graph, e.g.
+       int64 if they all are ints
+
+    Returns
+    -------
+    nodes : list
+       the node of graph for each id, i.e. nodes[i] is relabelled i
+    indptr : numpy.ndarray
+       the neighbours of i are indices[indptr[i]:indptr[i + 1]]
+    indices : numpy.ndarray
+       the ids of the neighbours, row by row
+    weights : numpy.ndarray
+       the weight of the edge to each entry of indices
+
+    Examples
+    --------
+    >>> G = nx.path_graph(3)
+    >>> nodes, indptr, indices, weights = graph_to_csr(G)
+    >>> indptr
+    array([0, 1, 3, 4])
+    """
+    nodes = graph.nodes()
+    ids = dict(zip(nodes, range(len(nodes))))
+    indptr = np.zeros(len(nodes) + 1, dtype = np.int64)
+    indices = []
+    weights = []
+    for node_id, node in enumerate(nodes) :
+        for neighbor, datas in graph[node].iteritems() :
+            indices.append(ids[neighbor])
+            weights.append(datas.get("weight", 1))
+        indptr[node_id + 1] = len(indices)
+
+    return (nodes, indptr, np.array(indices, dtype = np.int32),
+            np.array(weights, dtype = dtype))
+
+
+def csr_to_edges(indptr, indices, weights) :
+    """Return every link of a CSR graph once, as an edge array
+
+    Parameters
+    ----------
+    indptr, indices, weights : numpy.ndarray
+       the CSR arrays of the graph, as returned by graph_to_csr
+
+    Returns
+    -------
+    edges : numpy.ndarray
+       an (m, 2) array of the node ids of the ends of each link
+    edge_weights : numpy.ndarray
+       the weight of each link
+    """
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    upper = rows <= indices
+    return (np.column_stack((rows[upper], indices[upper])),
+            np.asarray(weights)[upper])
+
+
+def score_partitions(edges, edge_weights, partitions) :
+    """Compute the modularity of one or many partitions of the same graph
+
+    Gives the same values as modularity, but the internal weight and the
+    degree of every community are summed with np.bincount, for all the
+    partitions at once.
+
+    Parameters
+    ----------
+    edges : numpy.ndarray
+       an (m, 2) array of node ids, every link of the graph once, e.g. from csr_to_edges
+    edge_weights : numpy.ndarray or None
+       the weight of each link, None for weights of 1
+    partitions : numpy.ndarray
+       the community label of each node id, or a (k, n) array holding k partitions
+
+    Returns
+    -------
+    modularity : float or numpy.ndarray
+       the modularity of the partition, or of each of the k partitions
+
+    Raises
+    ------
+    ValueError
+        If the graph has no link
+
+    Examples
+    --------
+    >>> nodes, indptr, indices, weights = graph_to_csr(G)
+    >>> edges, edge_weights = csr_to_edges(indptr, indices, weights)
+    >>> parts = np.array([[part1[node] for node in nodes],
+    >>>                   [part2[node] for node in nodes]])
+    >>> score_partitions(edges, edge_weights, parts)
+    """
+    edges = np.asarray(edges)
+    partitions = np.asarray(partitions)
+    single = partitions.ndim == 1
+    partitions = np.atleast_2d(partitions)
+    num_parts, num_nodes = partitions.shape
+    if edge_weights is None :
+        edge_weights = np.ones(len(edges))
+    links = float(np.sum(edge_weights))
+    if links == 0 :
+        raise ValueError("A graph without link has an undefined modularity")
+
+    # a loop counts twice in the degree of its node, as in graph.degree
+    node_deg = (np.bincount(edges[:, 0], edge_weights, minlength = num_nodes)
+                + np.bincount(edges[:, 1], edge_weights,
+                              minlength = num_nodes))
+    labels = np.unique(partitions, return_inverse = True)[1]
+    labels = labels.reshape(partitions.shape)
+    num_labels = int(labels.max()) + 1
+    # give each partition its own range of labels to bincount them together
+    labels = labels + (np.arange(num_parts) * num_labels)[:, None]
+
+    com_deg = np.bincount(labels.ravel(), np.tile(node_deg, num_parts),
+                          minlength = num_parts * num_labels)
+    com_deg = com_deg.reshape(num_parts, num_labels)
+    inside = labels[:, edges[:, 0]] == labels[:, edges[:, 1]]
+    internal = np.dot(inside, edge_weights)
+
+    res = internal / links - np.sum(com_deg ** 2, axis = 1) / (4. * links ** 2)
+    if single :
+        return float(res[0])
+    return res
+
+
+def load_binary_csr(data, weights_data = None) :
+    """Map a binary graph as used by the cpp implementation as CSR arrays
+
+    The file holds the number of nodes n, the n cumulative degrees and then
+    the links, all as 32 bits unsigned ints.  It is memory mapped, so
+    indices is a view on the links of the file rather than a copy.
+
+    Parameters
+    ----------
+    data : str or file
+       the binary graph, as generated by the convert utility distributed with the C implementation
+    weights_data : str or file, optionnal
+       the weights of the links as 32 bits floats, as generated by convert -w. All weights are 1 without it
+
+    Returns
+    -------
+    indptr, indices, weights : numpy.ndarray
+       the CSR arrays of the graph, nodes being numbered as in the file
+
+    Examples
+    --------
+    >>> indptr, indices, weights = load_binary_csr("graph.bin")
+    >>> dendo = generate_dendogram_arrays(indptr, indices, weights)
+    """
+    header = np.memmap(data, dtype = "<u4", mode = "r", shape = (1,))
+    num_nodes = int(header[0])
+    cum_deg = np.memmap(data, dtype = "<u4", mode = "r", offset = 4,
+                        shape = (num_nodes,))
+    indptr = np.zeros(num_nodes + 1, dtype = np.int64)
+    indptr[1:] = cum_deg
+    num_links = int(indptr[-1])
+    indices = np.memmap(data, dtype = "<u4", mode = "r",
+                        offset = 4 * (num_nodes + 1), shape = (num_links,))
+    if weights_data is None :
+        weights = np.ones(num_links)
+    else :
+        weights = np.memmap(weights_data, dtype = "<f4", mode = "r",
+                            shape = (num_links,))
+    return indptr, indices, weights
+
+
+def generate_dendogram_arrays(indptr, indices, weights, part_init = None,
+                              workers = None, pruned = False,
+                              compact = False, resolution = 1., seed = None) :
+    """Find communities in a CSR graph and return the associated dendogram
+
+    Same as generate_dendogram_csr, but starts from CSR arrays such as the
+    ones of load_binary_csr, so no networkx graph is ever built.
+
+    Parameters
+    ----------
+    indptr, indices, weights : numpy.ndarray
+        the CSR arrays of the graph, every link being in the rows of its two ends
+    part_init : numpy.ndarray, optionnal
+        the community of each node to start from
+    workers, pruned, compact, resolution, seed : optionnal
+        as in generate_dendogram_csr
+
+    Returns
+    -------
+    dendogram : list of dictionaries
+        in the format of generate_dendogram, the keys of the first being the node ids
+    """
+    part = None
+    if part_init is not None :
+        part = __renumber(np.asarray(part_init))
+    levels, mod = __louvain_levels(indptr, indices, weights, part, workers,
+                                   pruned = pruned, resolution = resolution,
+                                   seed = seed)
+    return __make_dendogram(None, levels, compact)
+
+
+def generate_dendogram_csr(graph, part_init = None, workers = None,
+                           pruned = False, compact = False, resolution = 1.,
+                           seed = None) :
+    """Find communities in the graph and return the associated dendogram
+
+    Same algorithm and result format as generate_dendogram, but every level
+    is computed on the CSR arrays of graph_to_csr rather than on dicts and
+    networkx graphs, which is much lighter on big graphs.
+
+    Parameters
+    ----------
+    graph : networkx.Graph
+        the networkx graph which will be decomposed
+    part_init : dict, optionnal
+        the algorithm will start using this partition of the nodes. It's a dictionary where keys are their nodes and values the communities
+    workers : int, optionnal
+        if given, the local moves are computed in parallel by this many
+        processes, color class by color class (see color_classes), instead
+        of node by node
+    pruned : bool, optionnal
+        if True, after the first pass only the neighbours of the nodes which
+        moved are visited again, and the modularity is tracked from the
+        moves rather than recomputed after each pass
+    compact : bool, optionnal
+        if True, return an ArrayDendogram, holding one int32 array per level,
+        rather than a list of dictionaries
+    resolution : float, optionnal
+        the multiplier of the expected weight of a community in the
+        modularity, above 1 it favours smaller communities, below 1 bigger
+        ones (see resolution_sweep)
+    seed : int, optionnal
+        if given, the nodes are visited in a random order drawn from it
+        rather than in the order of graph.nodes(), see consensus_partition
+
+    Returns
+    -------
+    dendogram : list of dictionaries
+        a list of partitions, ie dictionnaries where keys of the i+1 are the values of the i. and where keys of the first are the nodes of graph
+
+    Raises
+    ------
+    TypeError
+        If the graph is not a networkx.Graph
+
+    See Also
+    --------
+    generate_dendogram, modularity_run
+
+    Notes
+    -----
+    In parallel mode the moves of a color class are all evaluated against
+    the same status and applied together.  The nodes of a class are never
+    linked, so the moves do not conflict and the result does not depend on
+    the number of workers, but it may differ slightly from the sequential
+    one.
+
+    Examples
+    --------
+    >>> G=nx.erdos_renyi_graph(100, 0.01)
+    >>> dendo = generate_dendogram_csr(G)
+    >>> part = partition_at_level(dendo, len(dendo) - 1)
+    """
+    if type(graph) != nx.Graph :
+        raise TypeError("Bad graph type, use only non directed graph")
+    nodes, indptr, indices, weights = graph_to_csr(graph)
+    part = None
+    if part_init is not None :
+        part = __renumber(np.array([part_init[node] for node in nodes]))
+
+    levels, mod = __louvain_levels(indptr, indices, weights, part, workers,
+                                   pruned = pruned, resolution = resolution,
+                                   seed = seed)
+    return __make_dendogram(nodes, levels, compact)
+
+
+def incremental_dendogram(graph, partition, added = (), removed = (),
+                          workers = None, pruned = False, compact = False) :
+    """Update a partition after a batch of edge insertions and deletions
+
+    Only the nodes touched by the batch and their neighbours are moved at
+    the first level, starting from partition, the other nodes keep their
+    community.  The upper levels are then computed on the induced graph,
+    which is small.
+
+    Parameters
+    ----------
+    graph : networkx.Graph
+        the graph after the batch was applied
+    partition : dict
+        the previous partition of the nodes, e.g. from modularity_run. Nodes missing from it start in their own community
+    added : list of edges, optionnal
+        the edges inserted in the graph since partition was computed
+    removed : list of edges, optionnal
+        the edges deleted from the graph since partition was computed
+    workers, pruned, compact : optionnal
+        as in generate_dendogram_csr
+
+    Returns
+    -------
+    dendogram : list of dictionaries
+        the updated dendogram, in the format of generate_dendogram
+    modularity : float
+        the modularity of its last level
+
+    Raises
+    ------
+    TypeError
+        If the graph is not a networkx.Graph
+
+    Examples
+    --------
+    >>> G = nx.erdos_renyi_graph(100, 0.01)
+    >>> part = modularity_run(G, engine = "csr")
+    >>> G.add_edge(0, 1)
+    >>> dendo, mod = incremental_dendogram(G, part, added = [(0, 1)])
+    """
+    if type(graph) != nx.Graph :
+        raise TypeError("Bad graph type, use only non directed graph")
+    nodes, indptr, indices, weights = graph_to_csr(graph)
+    com_ids = dict([])
+    part = np.empty(len(nodes), dtype = np.int64)
+    for node_id, node in enumerate(nodes) :
+        if node in partition :
+            part[node_id] = com_ids.setdefault(partition[node], len(com_ids))
+        else :
+            part[node_id] = -1
+    new = part < 0
+    part[new] = len(com_ids) + np.arange(new.sum())
+    part = __renumber(part)
+
+    ids = dict(zip(nodes, range(len(nodes))))
+    touched = set([])
+    for edge in list(added) + list(removed) :
+        touched.update([ids[node] for node in edge[:2] if node in ids])
+    touched = np.array(sorted(touched), dtype = np.int64)
+    active = np.union1d(touched, indices[__row_entries(indptr, touched)])
+
+    levels, mod = __louvain_levels(indptr, indices, weights, part, workers,
+                                   active, pruned)
+    return __make_dendogram(nodes, levels, compact), mod
+
+
+def resolution_sweep(graph, resolutions, workers = None, pruned = False) :
+    """Find the best partition of the graph at several resolutions
+
+    The graph is relabelled and turned into CSR arrays once.  The sorted
+    resolutions are cut in contiguous runs, one per worker, and inside a run
+    each resolution starts from the partition found at the next higher one.
+    That partition is finer and close to the one sought, and merging
+    communities is what the local moves do well, so few moves are needed.
+
+    Parameters
+    ----------
+    graph : networkx.Graph
+        the networkx graph which is decomposed
+    resolutions : list of float
+        the multipliers of the expected weight of a community, 1 giving the
+        usual modularity
+    workers : int, optionnal
+        if given, the runs are done in parallel by this many processes
+    pruned : bool, optionnal
+        as in generate_dendogram_csr
+
+    Returns
+    -------
+    table : list of tuples
+        one (resolution, partition, modularity, number of communities) per
+        resolution, by increasing resolution. The partition is a dictionary
+        where keys are the nodes and values the communities, and the
+        modularity is the usual one (resolution 1) of this partition
+
+    Raises
+    ------
+    TypeError
+        If the graph is not a networkx.Graph
+
+    Examples
+    --------
+    >>> G = nx.erdos_renyi_graph(100, 0.05)
+    >>> for gamma, part, mod, num in resolution_sweep(G, [0.5, 1., 2.]) :
+    >>>     print gamma, mod, num
+    """
+    global __sweep_shared
+    if type(graph) != nx.Graph :
+        raise TypeError("Bad graph type, use only non directed graph")
+    nodes, indptr, indices, weights = graph_to_csr(graph)
+    resolutions = sorted(resolutions)
+    if len(resolutions) == 0 :
+        return []
+    __sweep_shared = (indptr, indices, weights, pruned)
+
+    if workers is None or workers <= 1 :
+        parts = __sweep_run(resolutions)
+    else :
+        runs = [list(run) for run in
+                np.array_split(resolutions, min(workers, len(resolutions)))]
+        pool = multiprocessing.Pool(workers)
+        try :
+            parts = sum(pool.map(__sweep_run, runs), [])
+        finally :
+            pool.close()
+            pool.join()
+    __sweep_shared = None
+
+    edges, edge_weights = csr_to_edges(indptr, indices, weights)
+    mods = score_partitions(edges, edge_weights, np.array(parts))
+    table = []
+    for resolution, part, mod in zip(resolutions, parts, mods) :
+        table.append((resolution, dict(zip(nodes, part.tolist())),
+                      float(mod), int(part.max()) + 1))
+    return table
+
+
+__sweep_shared = None
+
+
+def __sweep_run(resolutions) :
+    """Partition the shared graph at each of the sorted resolutions, from
+    the highest down, each run starting from the partition of the previous
+    """
+    indptr, indices, weights, pruned = __sweep_shared
+    parts = []
+    part = None
+    for resolution in reversed(resolutions) :
+        levels, mod = __louvain_levels(indptr, indices, weights, part,
+                                       pruned = pruned,
+                                       resolution = resolution)
+        part = ArrayDendogram(levels).partition_array(len(levels) - 1)
+        part = __renumber(part)
+        parts.append(part)
+    parts.reverse()
+    return parts
+
+
+def consensus_partition(graph, runs = 10, workers = None, threshold = 0.5,
+                        max_rounds = 10, seed = 0) :
+    """Find a partition of the graph on which randomized Louvain runs agree
+
+    The result of Louvain depends on the order the nodes are visited.  Each
+    round makes runs Louvain runs, each visiting the nodes in a different
+    random order, and replaces the graph by its co-assignment graph : the
+    weight of an edge becomes the fraction of the runs putting its two ends
+    together, and the edges under threshold are dropped.  Only the existing
+    edges are counted, so the co-assignment graph is never denser than the
+    graph.  The rounds stop when all the runs agree.
+
+    Parameters
+    ----------
+    graph : networkx.Graph
+        the networkx graph which is decomposed
+    runs : int, optionnal
+        the number of randomized runs of a round
+    workers : int, optionnal
+        if given, the runs are made in parallel by this many processes,
+        which share the CSR arrays of the round instead of receiving them
+    threshold : float, optionnal
+        the fraction of the runs under which an edge is dropped
+    max_rounds : int, optionnal
+        the number of rounds after which the partition of the first run of
+        the last round is returned, even if the runs still disagree
+    seed : int, optionnal
+        the seed of the random orders, so the result is reproducible
+
+    Returns
+    -------
+    partition : dictionnary
+       The partition, with communities numbered from 0 to number of communities
+
+    Raises
+    ------
+    TypeError
+        If the graph is not a networkx.Graph
+
+    See Also
+    --------
+    coassignment_csr
+
+    Examples
+    --------
+    >>> G = nx.erdos_renyi_graph(100, 0.05)
+    >>> part = consensus_partition(G, runs = 20, workers = 4)
+    """
+    global __consensus_shared
+    if type(graph) != nx.Graph :
+        raise TypeError("Bad graph type, use only non directed graph")
+    nodes, indptr, indices, weights = graph_to_csr(graph)
+    seeds = seed * runs * max_rounds + np.arange(runs * max_rounds)
+
+    for rnd in range(max_rounds) :
+        __consensus_shared = (indptr, indices, weights)
+        round_seeds = seeds[rnd * runs:(rnd + 1) * runs].tolist()
+        if workers is None or workers <= 1 :
+            parts = map(__consensus_run, round_seeds)
+        else :
+            pool = multiprocessing.Pool(workers)
+            try :
+                parts = pool.map(__consensus_run, round_seeds)
+            finally :
+                pool.close()
+                pool.join()
+        __consensus_shared = None
+        if all((part == parts[0]).all() for part in parts[1:]) :
+            break
+        indptr, indices, weights = coassignment_csr(indptr, indices, parts,
+                                                    threshold)
+
+    return dict(zip(nodes, parts[0].tolist()))
+
+
+def coassignment_csr(indptr, indices, partitions, threshold = 0.) :
+    """Build the co-assignment graph of partitions over the edges of a graph
+
+    Parameters
+    ----------
+    indptr, indices : numpy.ndarray
+       the CSR arrays of the graph, as returned by graph_to_csr
+    partitions : list of numpy.ndarray
+       the community of every node in each partition
+    threshold : float, optionnal
+       the edges put together by a lower fraction of the partitions are
+       dropped
+
+    Returns
+    -------
+    indptr, indices, weights : numpy.ndarray
+       the CSR arrays of the co-assignment graph, without self loops, where
+       the weight of an edge is the fraction of the partitions putting its
+       two ends in the same community
+    """
+    num_nodes = len(indptr) - 1
+    rows = np.repeat(np.arange(num_nodes), np.diff(indptr))
+    together = np.zeros(len(indices), dtype = np.int64)
+    for partition in partitions :
+        partition = np.asarray(partition)
+        together += partition[rows] == partition[indices]
+    fraction = together / float(len(partitions))
+    keep = (fraction > 0) & (fraction >= threshold) & (rows != indices)
+    counts = np.bincount(rows[keep], minlength = num_nodes)
+    new_indptr = np.zeros(num_nodes + 1, dtype = np.int64)
+    np.cumsum(counts, out = new_indptr[1:])
+    return new_indptr, indices[keep], fraction[keep]
+
+
+# arrays shared with the forked workers of consensus_partition
+__consensus_shared = None
+
+
+def __consensus_run(seed) :
+    """Return the top level partition of a Louvain run on the shared graph,
+    visiting the nodes in the random order drawn from seed
+    """
+    indptr, indices, weights = __consensus_shared
+    if len(indices) == 0 :
+        return np.arange(len(indptr) - 1)
+    levels, mod = __louvain_levels(indptr, indices, weights, seed = seed)
+    return __renumber(ArrayDendogram(levels).partition_array(len(levels) - 1))
+
+
+def __make_dendogram(nodes, levels, compact) :
+    """Wrap the partition arrays of the levels in the dendogram asked for
+    """
+    dendogram = ArrayDendogram(levels, nodes)
+    if compact :
+        return dendogram
+    return dendogram.to_list()
+
+
+def __louvain_levels(indptr, indices, weights, part = None, workers = None,
+                     active = None, pruned = False, resolution = 1.,
+                     seed = None) :
+    """Run the Louvain levels on the CSR arrays
+
+    Returns the list of the partition arrays of every level, the partition
+    of level i + 1 being indexed by the communities of level i, and the
+    modularity of the last one, at the given resolution.  If active is
+    given, only these node ids are moved at the first level.  If seed is
+    given, the sequential sweeps visit the nodes in a random order drawn
+    from it rather than by increasing id.
+    """
+    random = None
+    if seed is not None :
+        random = np.random.RandomState(seed)
+        if active is None :
+            active = np.arange(len(indptr) - 1)
+        active = random.permutation(active)
+    status = ArrayStatus()
+    status.init(indptr, indices, weights, part)
+    levels = list()
+    __local_moves(indptr, indices, weights, status, workers, active, pruned,
+                  resolution)
+    partition = __renumber(status.node2com)
+    levels.append(partition)
+    mod = status.modularity(resolution)
+    indptr, indices, weights = induced_csr(partition, indptr, indices,
+                                           weights)
+    status.init(indptr, indices, weights)
+
+    while True :
+        order = None
+        if random is not None :
+            order = random.permutation(len(indptr) - 1)
+        __local_moves(indptr, indices, weights, status, workers, order,
+                      pruned, resolution)
+        new_mod = status.modularity(resolution)
+        if new_mod - mod < __MIN :
+            break
+        partition = __renumber(status.node2com)
+        levels.append(partition)
+        mod = new_mod
+        indptr, indices, weights = induced_csr(partition, indptr, indices,
+                                               weights)
+        status.init(indptr, indices, weights)
+    return levels, mod
+
+
+def induced_csr(partition, indptr, indices, weights) :
+    """Produce the CSR arrays of the graph where nodes are the communities
+
+    There is a link of weight w between communities if the sum of the
+    weights of the links between their elements is w.  The endpoints of
+    every entry are mapped through partition and the duplicated (com1, com2)
+    pairs are summed in one sort and reduce, without any per edge Python call.
+
+    Parameters
+    ----------
+    partition : numpy.ndarray
+       the community of each node, numbered from 0 to their number minus one
+    indptr, indices, weights : numpy.ndarray
+       the CSR arrays of the graph, as returned by graph_to_csr
+
+    Returns
+    -------
+    indptr, indices, weights : numpy.ndarray
+       the CSR arrays of the induced graph, whose nodes are the communities
+
+    Examples
+    --------
+    >>> nodes, indptr, indices, weights = graph_to_csr(nx.complete_graph(4))
+    >>> part = np.array([0, 0, 1, 1])
+    >>> induced_csr(part, indptr, indices, weights)
+    (array([0, 2, 4]), array([0, 1, 0, 1], dtype=int32), array([ 1.,  4.,  4.,  1.]))
+    """
+    partition = np.asarray(partition)
+    num_com = int(partition.max()) + 1
+    rows = np.repeat(np.arange(len(partition)), np.diff(indptr))
+    com1 = partition[rows].astype(np.int64)
+    com2 = partition[indices].astype(np.int64)
+    # an internal link is seen from both ends, a loop only once
+    halve = (com1 == com2) & (rows != indices)
+    entry_weights = np.where(halve, weights / 2., weights)
+
+    pairs, inverse = np.unique(com1 * num_com + com2, return_inverse = True)
+    new_weights = np.bincount(inverse, entry_weights).astype(np.float64)
+    new_rows = pairs // num_com
+    new_indptr = np.zeros(num_com + 1, dtype = np.int64)
+    np.cumsum(np.bincount(new_rows, minlength = num_com),
+              out = new_indptr[1:])
+    new_indices = (pairs % num_com).astype(np.int32)
+    return new_indptr, new_indices, new_weights
+
+
+def color_classes(indptr, indices, seed = 0) :
+    """Split the nodes of a CSR graph in classes of pairwise unlinked nodes
+
+    Uses the Jones-Plassmann heuristic, vectorized : at each round every
+    uncolored node whose random priority beats the ones of all its uncolored
+    neighbours gets the color of the round.
+
+    Parameters
+    ----------
+    indptr, indices : numpy.ndarray
+       the CSR arrays of the graph, as returned by graph_to_csr
+    seed : int, optionnal
+       the seed of the priorities, so the classes are reproducible
+
+    Returns
+    -------
+    classes : list of numpy.ndarray
+       the sorted node ids of each color class
+    """
+    num_nodes = len(indptr) - 1
+    rows = np.repeat(np.arange(num_nodes), np.diff(indptr))
+    keep = rows != indices
+    rows = rows[keep]
+    cols = indices[keep]
+    priority = np.random.RandomState(seed).permutation(num_nodes)
+    uncolored = np.ones(num_nodes, dtype = bool)
+    classes = []
+
+    while uncolored.any() :
+        active = uncolored[rows] & uncolored[cols]
+        rows = rows[active]
+        cols = cols[active]
+        beaten = np.zeros(num_nodes, dtype = bool)
+        beaten[rows[priority[cols] > priority[rows]]] = True
+        chosen = uncolored & ~beaten
+        classes.append(np.flatnonzero(chosen))
+        uncolored[chosen] = False
+    return classes
+
+
+def __local_moves(indptr, indices, weights, status, workers, nodes = None,
+                  pruned = False, resolution = 1.) :
+    """Run the local moves of one level, sequential unless workers is given
+
+    Only the node ids in nodes are moved, if given.
+    """
+    if workers is None :
+        __one_level(indptr, indices, weights, status, nodes, pruned,
+                    resolution)
+    else :
+        __one_level_parallel(indptr, indices, weights, status, workers, nodes,
+                             pruned, resolution)
+
+
+# arrays shared with the forked workers of __one_level_parallel
+__shared = None
+
+
+def __one_level_parallel(indptr, indices, weights, status, workers,
+                         nodes = None, pruned = False, resolution = 1.) :
+    """Compute one level of communities, a color class at a time
+
+    If pruned, a pass only visits the neighbours of the nodes which moved in
+    the previous one.
+
+    The CSR arrays are inherited by the forked workers and node2com and
+    degrees live in shared memory, so only node ranges and moves are sent
+    between processes.  If the moves of a class lower the modularity all
+    together, only those alone on their communities are kept.
+    """
+    global __shared
+    num_nodes = len(indptr) - 1
+    node2com = np.frombuffer(multiprocessing.RawArray("i", num_nodes),
+                             dtype = np.int32)
+    degrees = np.frombuffer(multiprocessing.RawArray("d", num_nodes),
+                            dtype = np.float64)
+    node2com[:] = status.node2com
+    degrees[:] = status.degrees
+    internals = status.internals
+    classes = color_classes(indptr, indices)
+    if nodes is not None :
+        classes = [color[np.in1d(color, nodes)] for color in classes]
+    queued = np.zeros(num_nodes, dtype = bool)
+    __shared = (indptr, indices, weights, node2com, degrees,
+                status.gdegrees, status.total_weight, resolution)
+    pool = None
+    if workers > 1 :
+        pool = multiprocessing.Pool(workers)
+
+    try :
+        nb_pass_done = 0
+        new_mod = status.modularity(resolution)
+        while nb_pass_done != __PASS_MAX :
+            cur_mod = new_mod
+            nb_pass_done += 1
+            modif = False
+
+            visit = classes
+            if pruned and nb_pass_done > 1 :
+                visit = [color[queued[color]] for color in classes]
+                queued[:] = False
+
+            for nodes in visit :
+                if pool is None or len(nodes) < __PARALLEL_MIN :
+                    moves = [__best_moves(nodes)]
+                else :
+                    moves = pool.map(__best_moves,
+                                     np.array_split(nodes, workers * 4))
+                new_com = np.concatenate([move[0] for move in moves])
+                w_old = np.concatenate([move[1] for move in moves])
+                w_new = np.concatenate([move[2] for move in moves])
+
+                # apply the moves together, in node order
+                old_com = node2com[nodes]
+                moved = new_com != old_com
+                if not moved.any() :
+                    continue
+                nodes = nodes[moved]
+                old_com = old_com[moved]
+                new_com = new_com[moved]
+                w_old = w_old[moved]
+                w_new = w_new[moved]
+                if not __apply_moves(nodes, old_com, new_com, w_old, w_new,
+                                     status, degrees, internals,
+                                     resolution) :
+                    # the gains were each found against the status before
+                    # the class moved, so nodes joining or leaving the same
+                    # community together can lose modularity.  Only the
+                    # moves alone on both their communities are then kept,
+                    # their gains being exact
+                    count = np.bincount(np.concatenate((old_com, new_com)),
+                                        minlength = num_nodes)
+                    alone = (count[old_com] == 1) & (count[new_com] == 1)
+                    if pruned :
+                        # the others are tried again in the next pass
+                        queued[nodes[~alone]] = True
+                    nodes = nodes[alone]
+                    old_com = old_com[alone]
+                    new_com = new_com[alone]
+                    if len(nodes) == 0 or \
+                       not __apply_moves(nodes, old_com, new_com,
+                                         w_old[alone], w_new[alone], status,
+                                         degrees, internals, resolution) :
+                        continue
+                modif = True
+                node2com[nodes] = new_com
+                if pruned :
+                    queued[indices[__row_entries(indptr, nodes)]] = True
+
+            new_mod = __modularity(internals, degrees, status.total_weight,
+                                   resolution)
+            if not modif or new_mod - cur_mod < __MIN :
+                break
+    finally :
+        if pool is not None :
+            pool.close()
+            pool.join()
+        __shared = None
+
+    status.node2com = node2com.copy()
+    status.degrees = degrees.copy()
+    status.internals = internals
+
+
+def __apply_moves(nodes, old_com, new_com, w_old, w_new, status, degrees,
+                  internals, resolution) :
+    """Move the nodes from old_com to new_com in degrees and internals, and
+    undo it if the modularity drops, returning whether the moves were kept
+
+    w_old and w_new are the weights from the nodes to old_com and new_com.
+    """
+    num_nodes = len(degrees)
+    touched = np.unique(np.concatenate((old_com, new_com)))
+    old_degrees = degrees[touched]
+    old_internals = internals[touched]
+    gdeg = status.gdegrees[nodes]
+    loops = status.loops[nodes]
+    degrees -= np.bincount(old_com, gdeg, minlength = num_nodes)
+    degrees += np.bincount(new_com, gdeg, minlength = num_nodes)
+    internals -= np.bincount(old_com, w_old + loops, minlength = num_nodes)
+    internals += np.bincount(new_com, w_new + loops, minlength = num_nodes)
+    gain = (__modularity(internals[touched], degrees[touched],
+                         status.total_weight, resolution)
+            - __modularity(old_internals, old_degrees, status.total_weight,
+                           resolution))
+    if gain < 0 :
+        degrees[touched] = old_degrees
+        internals[touched] = old_internals
+        return False
+    return True
+
+
+def __best_moves(nodes) :
+    """Find the best community of each node against the shared status
+
+    Same choice as in __one_level : the node leaves its community, then
+    goes to the neighbour community of highest positive increase, if any.
+
+    Returns
+    -------
+    new_com : the community chosen for each node
+    w_old : the weight from each node to its current community
+    w_new : the weight from each node to the community chosen
+    """
+    (indptr, indices, weights, node2com, degrees,
+     gdegrees, total_weight, resolution) = __shared
+    num_nodes = len(node2com)
+    home = node2com[nodes]
+    new_com = home.copy()
+    w_old = np.zeros(len(nodes))
+
+    # gather the entries of the rows of nodes
+    entries = __row_entries(indptr, nodes)
+    owner = np.repeat(np.arange(len(nodes)), np.diff(indptr)[nodes])
+    neighbors = indices[entries]
+    keep = neighbors != nodes[owner]
+    owner = owner[keep]
+    if len(owner) == 0 :
+        return new_com, w_old, w_old.copy()
+    coms = node2com[neighbors[keep]].astype(np.int64)
+
+    # weight from each node to each of its neighbour communities
+    pairs, inverse = np.unique(owner * num_nodes + coms,
+                               return_inverse = True)
+    dnc = np.bincount(inverse, weights[entries[keep]])
+    owner = pairs // num_nodes
+    coms = pairs % num_nodes
+    at_home = coms == home[owner]
+    w_old[owner[at_home]] = dnc[at_home]
+
+    node_deg = gdegrees[nodes][owner]
+    com_deg = degrees[coms] - np.where(at_home, node_deg, 0.)
+    incr = dnc - resolution * com_deg * node_deg / (total_weight * 2.)
+
+    # best increase of each node, ties to the lowest community
+    order = np.lexsort((-incr, owner))
+    first = order[np.r_[True, owner[order][1:] != owner[order][:-1]]]
+    first = first[incr[first] > 0]
+    new_com[owner[first]] = coms[first]
+    w_new = w_old.copy()
+    w_new[owner[first]] = dnc[first]
+    return new_com, w_old, w_new
+
+
+def __row_entries(indptr, nodes) :
+    """Return the positions in indices of the entries of the rows of nodes
+    """
+    starts = indptr[nodes]
+    counts = indptr[nodes + 1] - starts
+    offsets = np.cumsum(counts) - counts
+    return (np.arange(counts.sum()) - np.repeat(offsets, counts)
+            + np.repeat(starts, counts))
+
+
+def __renumber(node2com) :
+    """Renumber the communities from 0 to n in order of first appearance
+    """
+    values, first, inverse = np.unique(node2com, return_index = True,
+                                       return_inverse = True)
+    order = np.argsort(first)
+    rank = np.empty(len(values), dtype = np.int32)
+    rank[order] = np.arange(len(values), dtype = np.int32)
+    return rank[inverse]
+
+
+def __one_level(indptr, indices, weights, status, nodes = None,
+                pruned = False, resolution = 1.) :
+    """Compute one level of communities, moving only nodes if given
+
+    NumPy scalars are slow to read one at a time, so the sweep works on list
+    copies of the arrays of the nodes, which are written back to status at
+    the end.  The arrays of the links, which may be memory mapped, are not
+    copied : only the row of the node visited is read, as a list.  If
+    pruned, a pass only visits the neighbours of the nodes which moved in
+    the previous one and the modularity is updated from the moves.
+    """
+    indptr = indptr.tolist()
+    node2com = status.node2com.tolist()
+    degrees = status.degrees.tolist()
+    gdegrees = status.gdegrees.tolist()
+    internals = status.internals.tolist()
+    loops = status.loops.tolist()
+    total_weight = status.total_weight
+    num_nodes = len(node2com)
+    order = range(num_nodes) if nodes is None else np.asarray(nodes).tolist()
+
+    # neigh_weight[com] is the weight from the node to com, or -1 if unseen
+    neigh_weight = [-1.] * num_nodes
+    neigh_pos = [0] * num_nodes
+
+    queued = [False] * num_nodes
+    links = float(total_weight)
+
+    modif = True
+    nb_pass_done = 0
+    cur_mod = status.modularity(resolution)
+    new_mod = cur_mod
+
+    while modif and nb_pass_done != __PASS_MAX :
+        cur_mod = new_mod
+        modif = False
+        nb_pass_done += 1
+        visit = order
+        if pruned :
+            order = []
+            for node in visit :
+                queued[node] = False
+
+        for node in visit :
+            com_node = node2com[node]
+            degc_totw = resolution * gdegrees[node] / (total_weight * 2.)
+            neigh_last = 0
+            start = indptr[node]
+            stop = indptr[node + 1]
+            row = indices[start:stop].tolist()
+            for neighbor, weight in itertools.izip(row,
+                                                   weights[start:stop].tolist()) :
+                if neighbor != node :
+                    com = node2com[neighbor]
+                    if neigh_weight[com] < 0 :
+                        neigh_weight[com] = 0.
+                        neigh_pos[neigh_last] = com
+                        neigh_last += 1
+                    neigh_weight[com] += weight
+
+            # remove node from its community
+            old_internal = internals[com_node]
+            old_degree = degrees[com_node]
+            weight = max(neigh_weight[com_node], 0.)
+            degrees[com_node] -= gdegrees[node]
+            internals[com_node] -= weight + loops[node]
+
+            best_com = com_node
+            best_increase = 0
+            for pos in range(neigh_last) :
+                com = neigh_pos[pos]
+                incr = neigh_weight[com] - degrees[com] * degc_totw
+                if incr > best_increase :
+                    best_increase = incr
+                    best_com = com
+
+            # insert node in the best community
+            best_internal = internals[best_com]
+            best_degree = degrees[best_com]
+            weight = max(neigh_weight[best_com], 0.)
+            node2com[node] = best_com
+            degrees[best_com] += gdegrees[node]
+            internals[best_com] += weight + loops[node]
+            if best_com != com_node :
+                modif = True
+                if pruned :
+                    new_mod += ((internals[com_node] - old_internal
+                                 + internals[best_com] - best_internal) / links
+                                + resolution
+                                * (old_degree ** 2 - degrees[com_node] ** 2
+                                   + best_degree ** 2 - degrees[best_com] ** 2)
+                                / (2. * links) ** 2)
+                    for neighbor in row :
+                        if not queued[neighbor] and neighbor != node :
+                            queued[neighbor] = True
+                            order.append(neighbor)
+
+            for pos in range(neigh_last) :
+                neigh_weight[neigh_pos[pos]] = -1.
+
+        if not pruned :
+            new_mod = __modularity(internals, degrees, total_weight,
+                                   resolution)
+        if new_mod - cur_mod < __MIN :
+            break
+
+    status.node2com = np.array(node2com, dtype = np.int32)
+    status.degrees = np.array(degrees, dtype = np.float64)
+    status.internals = np.array(internals, dtype = np.float64)
+
+
+def __modularity(internals, degrees, total_weight, resolution = 1.) :
+    """Compute the modularity from the flat arrays of the communities
+    """
+    links = float(total_weight)
+    if links <= 0 :
+        return 0.
+    internals = np.asarray(internals, dtype = np.float64)
+    degrees = np.asarray(degrees, dtype = np.float64)
+    return float(np.sum(internals / links
+                        - resolution * (degrees / (2. * links)) ** 2))
+
+
+class ArrayStatus :
+    """
+    Status of the Louvain heuristic on a CSR graph, kept in flat arrays.
+
+    node2com, gdegrees and loops are indexed by node id, degrees and
+    internals by community id, communities being numbered below the number
+    of nodes.
+    """
+    node2com = None
+    total_weight = 0
+    internals = None
+    degrees = None
+    gdegrees = None
+    loops = None
+
+    def __init__(self) :
+        self.node2com = np.zeros(0, dtype = np.int32)
+        self.total_weight = 0
+        self.degrees = np.zeros(0)
+        self.gdegrees = np.zeros(0)
+        self.internals = np.zeros(0)
+        self.loops = np.zeros(0)
+
+    def __str__(self) :
+        return ("node2com : " + str(self.node2com) + " degrees : "
+            + str(self.degrees) + " internals : " + str(self.internals)
+            + " total_weight : " + str(self.total_weight))
+
+    def copy(self) :
+        """Perform a deep copy of status"""
+        new_status = ArrayStatus()
+        new_status.node2com = self.node2com.copy()
+        new_status.internals = self.internals.copy()
+        new_status.degrees = self.degrees.copy()
+        new_status.gdegrees = self.gdegrees.copy()
+        new_status.loops = self.loops.copy()
+        new_status.total_weight = self.total_weight
+        return new_status
+
+    def init(self, indptr, indices, weights, part = None) :
+        """Initialize the status of a CSR graph
+
+        Every node is put in its own community, unless part, an array of
+        community ids numbered from 0, is given.
+        """
+        num_nodes = len(indptr) - 1
+        rows = np.repeat(np.arange(num_nodes), np.diff(indptr))
+        is_loop = rows == indices
+        self.loops = np.bincount(rows[is_loop], weights[is_loop],
+                                 minlength = num_nodes).astype(np.float64)
+        self.gdegrees = np.bincount(rows, weights,
+                                    minlength = num_nodes) + self.loops
+        self.total_weight = float(self.gdegrees.sum()) / 2.
+        if part is None :
+            self.node2com = np.arange(num_nodes, dtype = np.int32)
+            self.degrees = self.gdegrees.copy()
+            self.internals = self.loops.copy()
+        else :
+            self.node2com = np.asarray(part, dtype = np.int32)
+            self.degrees = np.bincount(self.node2com, self.gdegrees,
+                                       minlength = num_nodes)
+            coms = self.node2com[rows]
+            inside = coms == self.node2com[indices]
+            # an internal link is seen from both ends, a loop only once
+            inc = np.where(is_loop, weights, weights / 2.)
+            self.internals = np.bincount(coms[inside], inc[inside],
+                                         minlength = num_nodes)
+
+    def modularity(self, resolution = 1.) :
+        """Compute the modularity of the current partition
+
+        The resolution multiplies the expected weight of the communities.
+        """
+        links = float(self.total_weight)
+        if links <= 0 :
+            return 0.
+        return float(np.sum(self.internals / links
+                            - resolution * (self.degrees / (2. * links)) ** 2))
+
+
+class ArrayDendogram :
+    """
+    A dendogram holding the partition of each level as one int32 array.
+
+    Level 0 maps the nodes, in the order of nodes, to their community and
+    level i + 1 maps the communities of level i to theirs.  Indexing or
+    iterating gives the levels as dictionaries, as in the dendograms of
+    generate_dendogram, built when asked for, so the dendogram can be used
+    by the code written for those.
+    """
+    levels = None
+    nodes = None
+
+    def __init__(self, levels, nodes = None) :
+        self.levels = [np.asarray(level, dtype = np.int32)
+                       for level in levels]
+        self.nodes = nodes
+
+    def __str__(self) :
+        return ("ArrayDendogram of " + str(len(self.levels)) + " levels over "
+                + str(len(self.levels[0]) if self.levels else 0) + " nodes")
+
+    def __len__(self) :
+        return len(self.levels)
+
+    def __getitem__(self, level) :
+        if level < 0 :
+            level += len(self.levels)
+        if level == 0 and self.nodes is not None :
+            return dict(zip(self.nodes, self.levels[0].tolist()))
+        return dict(enumerate(self.levels[level].tolist()))
+
+    def __iter__(self) :
+        for level in range(len(self.levels)) :
+            yield self[level]
+
+    def to_list(self) :
+        """Return the dendogram as a list of dictionaries"""
+        return list(self)
+
+    def partition_array(self, level) :
+        """Return the community of every node at level, in the order of nodes
+        """
+        partition = self.levels[0]
+        for index in range(1, level + 1) :
+            partition = self.levels[index][partition]
+        return partition
+
+    def partition_at_level(self, level) :
+        """Return the partition of the nodes at level as a dictionary"""
+        partition = self.partition_array(level).tolist()
+        if self.nodes is None :
+            return dict(enumerate(partition))
+        return dict(zip(self.nodes, partition))
+
+    def save(self, filename) :
+        """Write the dendogram to a .npz file, see load_dendogram"""
+        arrays = dict([("level_" + str(index), level)
+                       for index, level in enumerate(self.levels)])
+        if self.nodes is not None :
+            # the nodes are kept as objects, as np.array would turn mixed
+            # labels into strings and tuples into rows
+            nodes = np.empty(len(self.nodes), dtype = object)
+            for index, node in enumerate(self.nodes) :
+                nodes[index] = node
+            arrays["nodes"] = nodes
+        np.savez(filename, **arrays)
+
+
+def load_dendogram(filename) :
+    """Read a dendogram written by ArrayDendogram.save
+
+    Parameters
+    ----------
+    filename : str
+       the .npz file
+
+    Returns
+    -------
+    dendogram : ArrayDendogram
+    """
+    data = np.load(filename, allow_pickle = True)
+    levels = []
+    while "level_" + str(len(levels)) in data.files :
+        levels.append(data["level_" + str(len(levels))])
+    nodes = None
+    if "nodes" in data.files :
+        nodes = data["nodes"].tolist()
+    data.close()
+    return ArrayDendogram(levels, nodes)
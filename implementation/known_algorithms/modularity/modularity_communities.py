@@ -16,8 +16,12 @@ __MIN = 0.0000001
 
 import networkx as nx
 import sys
-import types
-import array
+import collections
+import numpy as np
+
+from modularity_arrays import (ArrayDendogram, ArrayStatus,
+                               generate_dendogram_arrays,
+                               generate_dendogram_csr, load_binary_csr)
 
 
 def partition_at_level(dendogram, level) :
@@ -29,8 +33,8 @@ def partition_at_level(dendogram, level) :
 
     Parameters
     ----------
-    dendogram : list of dict
-       a list of partitions, ie dictionnaries where keys of the i+1 are the values of the i.
+    dendogram : list of dict or ArrayDendogram
+       a list of partitions, ie dictionnaries where keys of the i+1 are the values of the i. An ArrayDendogram is composed by array indexing.
     level : int
        the level which belongs to [0..len(dendogram)-1]
 
@@ -56,6 +60,8 @@ def partition_at_level(dendogram, level) :
     >>> for level in range(len(dendo) - 1) :
     >>>     print "partition at level", level, "is", partition_at_level(dendo, level)
     """
+    if isinstance(dendogram, ArrayDendogram) :
+        return dendogram.partition_at_level(level)
     partition = dendogram[0].copy()
     for index in range(1, level + 1) :
         for node, community in partition.iteritems() :
@@ -123,7 +129,8 @@ def modularity(partition, graph) :
     return res
 
 
-def modularity_run(graph, partition = None) :
+def modularity_run(graph, partition = None, engine = "dict", workers = None,
+                   pruned = False) :
     """Compute the partition of the graph nodes which maximises the modularity
     (or try..) using the Louvain heuristices
 
@@ -136,6 +143,13 @@ def modularity_run(graph, partition = None) :
        the networkx graph which is decomposed
     partition : dict, optionnal
        the algorithm will start using this partition of the nodes. It's a dictionary where keys are their nodes and values the communities
+    engine : str, optionnal
+       "dict" to use generate_dendogram, "csr" to use generate_dendogram_csr
+       which works on arrays and is much faster on big graphs
+    workers : int, optionnal
+       number of processes for the parallel local moves of the "csr" engine
+    pruned : bool, optionnal
+       only visit again the neighbours of the nodes which moved, see generate_dendogram
 
     Returns
     -------
@@ -146,6 +160,8 @@ def modularity_run(graph, partition = None) :
     ------
     NetworkXError
        If the graph is not Eulerian.
+    ValueError
+       If the engine is unknown, or workers is given to the "dict" engine
 
     See Also
     --------
@@ -184,11 +200,19 @@ def modularity_run(graph, partition = None) :
     >>> nx.draw_networkx_edges(G,pos, alpha=0.5)
     >>> plt.show()
     """
-    dendo = generate_dendogram(graph, partition)
+    if engine == "dict" :
+        if workers is not None :
+            raise ValueError("Parallel local moves need the csr engine")
+        dendo = generate_dendogram(graph, partition, pruned)
+    elif engine == "csr" :
+        dendo = generate_dendogram_csr(graph, partition, workers, pruned,
+                                       compact = True)
+    else :
+        raise ValueError("Unknown engine " + str(engine))
     return partition_at_level(dendo, len(dendo) - 1 )
 
 
-def generate_dendogram(graph, part_init = None) :
+def generate_dendogram(graph, part_init = None, pruned = False) :
     """Find communities in the graph and return the associated dendogram
 
     A dendogram is a tree and each level is a partition of the graph nodes.  Level 0 is the first partition, which contains the smallest communities, and the best is len(dendogram) - 1. The higher the level is, the bigger are the communities
@@ -200,6 +224,8 @@ def generate_dendogram(graph, part_init = None) :
         the networkx graph which will be decomposed
     part_init : dict, optionnal
         the algorithm will start using this partition of the nodes. It's a dictionary where keys are their nodes and values the communities
+    pruned : bool, optionnal
+        if True, after the first pass only the neighbours of the nodes which moved are visited again, and the modularity is tracked from the moves rather than recomputed after each pass
 
     Returns
     -------
@@ -237,7 +263,7 @@ def generate_dendogram(graph, part_init = None) :
     status.init(current_graph, part_init)
     mod = __modularity(status)
     status_list = list()
-    __one_level(current_graph, status)
+    __one_level(current_graph, status, pruned)
     new_mod = __modularity(status)
     partition = __renumber(status.node2com)
     status_list.append(partition)
@@ -246,7 +272,7 @@ def generate_dendogram(graph, part_init = None) :
     status.init(current_graph)
     
     while True :
-        __one_level(current_graph, status)
+        __one_level(current_graph, status, pruned)
         new_mod = __modularity(status)
         if new_mod - mod < __MIN :
             break
@@ -263,6 +289,8 @@ def induced_graph(partition, graph) :
 
     there is a link of weight w between communities if the sum of the weights of the links between their elements is w
 
+    The graph is built edge by edge, so its adjacency, and the levels of generate_dendogram, stay as they are: callers which can take CSR arrays should use induced_csr
+
     Parameters
     ----------
     partition : dict
@@ -323,49 +351,43 @@ def __renumber(dictionary) :
 def __load_binary(data) :
     """Load binary graph as used by the cpp implementation of this algorithm
     """
-    if type(data) == types.StringType :
-        data = open(data, "rb")
-        
-    reader = array.array("I")
-    reader.fromfile(data, 1)
-    num_nodes = reader.pop()
-    reader = array.array("I")
-    reader.fromfile(data, num_nodes)
-    cum_deg = reader.tolist()
-    num_links = reader.pop()
-    reader = array.array("I")
-    reader.fromfile(data, num_links)
-    links = reader.tolist()
+    indptr, indices, weights = load_binary_csr(data)
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
     graph = nx.Graph()
-    graph.add_nodes_from(range(num_nodes))
-    prec_deg = 0
-    
-    for index in range(num_nodes) :
-        last_deg = cum_deg[index]
-        neighbors = links[prec_deg:last_deg]
-        graph.add_edges_from([(index, int(neigh)) for neigh in neighbors])
-        prec_deg = last_deg
-        
+    graph.add_nodes_from(range(len(indptr) - 1))
+    graph.add_edges_from(zip(rows.tolist(), indices.tolist()))
     return graph
 
 
-def __one_level(graph, status) :
+def __one_level(graph, status, pruned = False) :
     """Compute one level of communities
+
+    If pruned, a pass only visits the nodes queued by the previous one, i.e.
+    the neighbours of the nodes which moved.
     """
     modif = True
     nb_pass_done = 0
     cur_mod = __modularity(status)
     new_mod = cur_mod
+    queue = collections.deque(graph.nodes() if pruned else [])
+    queued = set(queue)
     
     while modif  and nb_pass_done != __PASS_MAX :
         cur_mod = new_mod
         modif = False
         nb_pass_done += 1
         
-        for node in graph.nodes() :
+        if pruned :
+            visit = [queue.popleft() for index in range(len(queue))]
+            queued.clear()
+        else :
+            visit = graph.nodes()
+        for node in visit :
             com_node = status.node2com[node]
             degc_totw = status.gdegrees.get(node, 0.) / (status.total_weight*2.)
             neigh_communities = __neighcom(node, graph, status)
+            if pruned :
+                old_mod = __com_modularity(com_node, status)
             __remove(node, com_node,
                     neigh_communities.get(com_node, 0.), status)
             best_com = com_node
@@ -375,11 +397,21 @@ def __one_level(graph, status) :
                 if incr > best_increase :
                     best_increase = incr
                     best_com = com                    
+            if pruned and best_com != com_node :
+                old_mod += __com_modularity(best_com, status)
             __insert(node, best_com,
                     neigh_communities.get(best_com, 0.), status)
             if best_com != com_node :
                 modif = True                
-        new_mod = __modularity(status)
+                if pruned :
+                    new_mod += (__com_modularity(com_node, status)
+                                + __com_modularity(best_com, status) - old_mod)
+                    for neighbor in graph[node] :
+                        if neighbor not in queued and neighbor != node :
+                            queue.append(neighbor)
+                            queued.add(neighbor)
+        if not pruned :
+            new_mod = __modularity(status)
         if new_mod - cur_mod < __MIN :
             break
 
@@ -489,6 +521,18 @@ def __insert(node, com, weight, status) :
                         weight + status.loops.get(node, 0.) )
 
 
+def __com_modularity(community, status) :
+    """
+    Compute the part of the modularity due to one community, so that the modularity can be updated around a move
+    """
+    links = float(status.total_weight)
+    if links <= 0 :
+        return 0.
+    in_degree = status.internals.get(community, 0.)
+    degree = status.degrees.get(community, 0.)
+    return in_degree / links - ((degree / (2.*links))**2)
+
+
 def __modularity(status) :
     """
     Compute the modularity of the partition of the graph faslty using status precomputed
@@ -504,14 +548,24 @@ def __modularity(status) :
 
 
 def __main() :
-    """Main function to mimic C++ version behavior"""
+    """Main function to mimic C++ version behavior
+
+    The graph is memory mapped and decomposed as CSR arrays, without
+    networkx, and the partition is kept in arrays down to the output, so
+    big binary graphs fit in memory.
+    """
     try :
         filename = sys.argv[1]
-        graphfile = __load_binary(filename)
-        partition = modularity_run(graphfile)
-        print >> sys.stderr, str(modularity(partition, graphfile))
-        for elem, part in partition.iteritems() :
-            print str(elem) + " " + str(part)
+        indptr, indices, weights = load_binary_csr(filename)
+        dendo = generate_dendogram_arrays(indptr, indices, weights,
+                                          compact = True)
+        partition = dendo.partition_array(len(dendo) - 1)
+        status = ArrayStatus()
+        status.init(indptr, indices, weights, partition)
+        print >> sys.stderr, str(status.modularity())
+        np.savetxt(sys.stdout,
+                   np.column_stack((np.arange(len(partition)), partition)),
+                   fmt = "%d")
     except (IndexError, IOError):
         print "Usage : ./community filename"
         print "find the communities in graph filename and display the dendogram"
@@ -2,8 +2,10 @@
 
 from candidates import *
 from community import *
+from degree_index import *
 from grow import *
 
 import candidates
 import community
+import degree_index
 import grow
\ No newline at end of file
@@ -1,4 +1,5 @@
 import CommunityDetection as CD
+import heapq
 import numpy as np
 
 class Candidates:
@@ -12,9 +13,17 @@ class Candidates:
     
     Both have the format:
     in particular {n:{'e':0, 'p':0.}}
+    
+    The nodes of close are also kept in two max-heaps, on 'e' and on 'p', of
+    (-value, -push, n), so get_best need not go through all of close, see
+    get_outlier.  Each node of close is also in one of two min-heaps of
+    (value, push, n), watch_e on its 'e' if it is at least min_e and watch_p
+    on its 'p' otherwise, so the nodes that stopped being candidates are on
+    top of them, see close_outlier.  An entry is stale once n left close or
+    was pushed again.
     """
     
-    def __init__(self, graph, candidates, c):
+    def __init__(self, graph, candidates, c, degrees=None):
         """Divides and stores the candidates into fringe and close based on c.
         
         Parameters
@@ -22,11 +31,21 @@ class Candidates:
         graph : a networkx graph
         candidates : a dictionary with the nodes attached to but not in c and info
         c : a Community
+        degrees : a DegreeIndex of graph, that of c if None
         """
+        if degrees is None:
+            degrees = c.degrees
         self.graph = graph
+        self.degrees = degrees
         self.c = c
         self.fringe = {}
         self.close = {}
+        self.heap_e = []
+        self.heap_p = []
+        self.watch_e = []
+        self.watch_p = []
+        self.pushes = {}
+        self.num_pushes = 0
         self.stats = {'total_e':0., 'total_e_sq':0.,
                       'total_p':0., 'total_p_sq':0.,
                       'all_e':[], 'all_p':[],
@@ -43,6 +62,7 @@ class Candidates:
         for n, spec in changed.iteritems():
             if self.c.is_candidate(spec):
                 self.close[n] = spec
+                self.push(n, spec)
                 if n in self.fringe:
                     self.fringe.pop(n)
             elif spec['e'] == 0:
@@ -53,6 +73,39 @@ class Candidates:
                     self.close.pop(n)
                     
                     
+    def push(self, n, spec):
+        """Enters n, just checked to be a candidate, in the heaps of close.
+        """
+        self.num_pushes += 1
+        self.pushes[n] = self.num_pushes
+        heapq.heappush(self.heap_e, (-spec['e'], -self.num_pushes, n))
+        heapq.heappush(self.heap_p, (-spec['p'], -self.num_pushes, n))
+        self.watch(n, spec, self.num_pushes)
+        
+        if len(self.heap_e) > 2 * len(self.close) + 64:
+            # too many stale entries, keep only the live ones
+            self.heap_e = [(-spec['e'], -self.pushes[m], m)
+                           for m, spec in self.close.iteritems()]
+            self.heap_p = [(-spec['p'], -self.pushes[m], m)
+                           for m, spec in self.close.iteritems()]
+            heapq.heapify(self.heap_e)
+            heapq.heapify(self.heap_p)
+            self.watch_e = []
+            self.watch_p = []
+            for m, spec in self.close.iteritems():
+                self.watch(m, spec, self.pushes[m])
+                
+                
+    def watch(self, n, spec, push):
+        """Enters n of close in watch_e if its 'e' is at least min_e, else in
+        watch_p.
+        """
+        if spec['e'] >= self.c.bounds['min_e']:
+            heapq.heappush(self.watch_e, (spec['e'], push, n))
+        else:
+            heapq.heappush(self.watch_p, (spec['p'], push, n))
+            
+            
     def update_stats(self, spec, add=True):
         """Updates the stats to reflect adding/removing a node
         """
@@ -75,8 +128,22 @@ class Candidates:
         self.stats['total_p_sq'] += multi * spec['p']**2  
         
 
-    def stat_import(self, spec):
-        """ Finds by how much variance the spec can be important
+    def classify_arrays(self, e, p):
+        """ Same as Community.classification for arrays of 'e' and 'p', returns
+        whether each 'e' is more important than its 'p'
+        """
+        self.update_import()
+        e_import = np.zeros(len(e))
+        if self.stats['var_e'] > 0:
+            e_import = (e - self.stats['avg_e']) / self.stats['var_e']**.5
+        p_import = np.zeros(len(p))
+        if self.stats['var_p'] > 0.:
+            p_import = (p - self.stats['avg_p']) / self.stats['var_p']**.5
+        return e_import > p_import
+        
+        
+    def update_import(self):
+        """ Computes the averages and variances of stat_import if dirty
         """
         if self.stats['dirty']:
             n = max(float(len(self.fringe) + len(self.close)), 1.0)              
@@ -88,6 +155,11 @@ class Candidates:
                 - self.stats['avg_p']**2  
             self.stats['dirty'] = False
 
+
+    def stat_import(self, spec):
+        """ Finds by how much variance the spec can be important
+        """
+        self.update_import()
         if self.stats['var_e'] > 0:
             e_import = (spec['e'] - self.stats['avg_e']) / self.stats['var_e']**.5
         else:
@@ -178,6 +250,22 @@ class Candidates:
         -------
         best : the key of the furtherest outlier
         reclassify : the set of nodes that were not candidates
+        
+        Method
+        ------
+        The importance of a spec is the larger of the z-scores of its 'e' and
+        its 'p', so the outlier of close is the node on top of its heap on
+        'e' or of that on 'p'.  Of nodes as far out, the last one in data
+        is the outlier when data is gone through, see scan_outlier, and the
+        last one pushed in close.
+        """
+        if data is self.close:
+            return self.close_outlier()
+        return self.scan_outlier(data)
+        
+        
+    def scan_outlier(self, data):
+        """Finds the outlier of data, see get_outlier, going through all of it
         """
         best = None
         prob = 0.
@@ -196,6 +284,70 @@ class Candidates:
         return best, reclassify    
         
         
+    def close_outlier(self):
+        """Finds the outlier of close from its heaps, see get_outlier
+        
+        A node of close stops being a candidate once both its 'e' and its
+        'p' are under the bounds, so only the nodes of watch_e under min_e
+        and of watch_p under min_p are checked again.  Those still over the
+        other bound are watched on it, the others are to be reclassified, in
+        the order they were pushed, and stay in their heap until they are.
+        """
+        bounds = self.c.bounds
+        watches = {'e':self.watch_e, 'p':self.watch_p}
+        failed = []
+        for (key, other) in [('e', 'p'), ('p', 'e')]:
+            heap = watches[key]
+            popped = []
+            while self.top(heap) is not None and \
+                  heap[0][0] < bounds['min_' + key]:
+                entry = heapq.heappop(heap)
+                spec = self.close[entry[2]]
+                if spec[other] >= bounds['min_' + other]:
+                    heapq.heappush(watches[other],
+                                   (spec[other], entry[1], entry[2]))
+                else:
+                    popped.append(entry)
+            for entry in popped:
+                heapq.heappush(heap, entry)
+            failed.extend([(push, n) for (value, push, n) in popped])
+            
+        reclassify = {}
+        for (push, n) in sorted(failed):
+            reclassify[n] = self.close[n]
+        
+        top_e = self.top(self.heap_e)
+        if top_e is None:
+            return None, reclassify
+        top_p = self.top(self.heap_p)
+        top_stat = self.stat_import({'e':-top_e[0], 'p':-top_p[0]})
+        prob = max(top_stat['e'], top_stat['p'])
+        if not prob >= 0.:
+            return None, reclassify
+            
+        # the nodes as far out in a key are those of the top value of its
+        # heap, all of close if its variance is 0, the last pushed on top
+        best = None
+        for (top, key) in [(top_e, 'e'), (top_p, 'p')]:
+            if top_stat[key] == prob and \
+               (best is None or -top[1] > self.pushes[best]):
+                best = top[2]
+        return best, reclassify
+
+
+    def top(self, heap):
+        """Drops the stale entries on top of heap and returns the top one, or
+        None if heap is empty
+        """
+        # the push is negated in the heaps on the outlier
+        while heap and (self.pushes.get(heap[0][2]) != abs(heap[0][1])
+                        or heap[0][2] not in self.close):
+            heapq.heappop(heap)
+        if heap:
+            return heap[0]
+        return None
+        
+        
     def drop_connectivity(self, to_drop, n):
         """Drops the connectivity of nodes in to_drop by 1 and reclassifies them
         """
@@ -265,9 +417,7 @@ class Candidates:
             self.update_stats(spec, add=False)
 
         spec['e'] += inc
-        out_degree = sum([self.graph[n][m]['weight']
-                          for m in self.graph.neighbors(n)])
-        spec['p'] = spec['e'] / float(out_degree)
+        spec['p'] = spec['e'] / float(self.degrees[n])
         self.update_stats(spec)
         
         
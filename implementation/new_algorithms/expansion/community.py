@@ -1,6 +1,8 @@
 
 import numpy as np
 
+from degree_index import DegreeIndex
+
 class Community:
     """controls the set of nodes we are expanding to become a community.
     
@@ -14,18 +16,22 @@ class Community:
                    'stats':{'avg_e':0., 'sd_e':0., 'avg_p':0., 'sd_p':0.}}
     """
     
-    def init(self, graph, nodes):
+    def init(self, graph, nodes, degrees=None):
         """ Creates a community.
         Parameters
         ----------
         graph : a networkx graph
         nodes : the nodes to include in the community
+        degrees : a DegreeIndex of graph, a new one if None
         
         Returns
         -------
         candidates : a dict of nodes connected to C and their #edges into C
         """
         
+        if degrees is None:
+            degrees = DegreeIndex(graph)
+        self.degrees = degrees
         self.nodes = {}
         for n in nodes:
             self.nodes[n] = {'e':0}
@@ -43,14 +49,10 @@ class Community:
                     external_nodes[m]['e'] += 1 * graph[n][m]['weight']
 
         for n, spec in self.nodes.iteritems():
-            out_degree = sum([graph[n][m]['weight']
-                              for m in graph.neighbors(n)])
-            spec['p'] = spec['e'] / float(out_degree)    
+            spec['p'] = spec['e'] / float(degrees[n])
 
         for n, spec in external_nodes.iteritems():
-            out_degree = sum([graph[n][m]['weight']
-                              for m in graph.neighbors(n)])
-            spec['p'] = spec['e'] / float(out_degree)
+            spec['p'] = spec['e'] / float(degrees[n])
             
         return external_nodes
     
@@ -66,15 +68,27 @@ class Community:
     def update_bounds(self):
         """Updates the bounds to find the new min_e and min_p. Updates the
         reason of why each node is in the community as well.
+        
+        The stats of the candidates change with every node added or removed,
+        so all the nodes are classified again, at once in arrays.
         """
+        specs = self.nodes.values()
+        e = np.array([spec['e'] for spec in specs], dtype=float)
+        p = np.array([spec['p'] for spec in specs], dtype=float)
+        is_e = self.cand.classify_arrays(e, p)
+        for (spec, e_reason) in zip(specs, is_e.tolist()):
+            spec['reason'] = 'p'
+            if e_reason:
+                spec['reason'] = 'e'
+                
         self.bounds['min_e'] = len(self.nodes)
         self.bounds['min_p'] = 1.0
-        for n, spec in self.nodes.iteritems():
-            spec['reason'] = self.classification(spec)
-            if spec['reason'] == 'e':
-                self.bounds['min_e'] = min(self.bounds['min_e'], int(spec['e']))
-            else:
-                self.bounds['min_p'] = min(self.bounds['min_p'], spec['p'])
+        if is_e.any():
+            self.bounds['min_e'] = min(self.bounds['min_e'],
+                                       int(e[is_e].min()))
+        if not is_e.all():
+            self.bounds['min_p'] = min(self.bounds['min_p'],
+                                       float(p[~is_e].min()))
                     
             
     def classification(self, spec):
@@ -156,9 +170,7 @@ class Community:
         """Updates the node n's connectivity to the community by inc.
         """
         self.nodes[n]['e'] += inc
-        out_degree = sum(graph[n][m]['weight'] for m in graph.neighbors(n))
-        self.nodes[n]['p'] = self.nodes[n]['e'] / float(out_degree)
-        self.nodes[n]['reason'] = self.classification(self.nodes[n])
+        self.nodes[n]['p'] = self.nodes[n]['e'] / float(self.degrees[n])
         
         
     def to_string(self):
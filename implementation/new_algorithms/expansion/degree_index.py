@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+class DegreeIndex(dict):
+    """Keeps the weighted degree of the nodes of a graph for the expansion.
+
+    The weighted degree of a node is the sum of the weights of its edges,
+    the denominator of 'p' in Community and Candidates.  It is computed the
+    first time a node is looked up and kept, so one index can be shared by
+    every expansion of a graph, see expand_all.  The index does not see
+    changes to the graph : invalidate must be called after adding, removing
+    or reweighting edges.
+
+    Data Structures
+    ---------------
+    graph : the networkx graph indexed
+    in particular {n:out_degree}
+    """
+
+    def __init__(self, graph):
+        """Creates an empty index of graph, filled as nodes are looked up.
+        """
+        dict.__init__(self)
+        self.graph = graph
+
+
+    def __missing__(self, n):
+        """Computes, stores and returns the weighted degree of n
+        """
+        out_degree = sum([self.graph[n][m]['weight']
+                          for m in self.graph.neighbors(n)])
+        self[n] = out_degree
+        return out_degree
+
+
+    def invalidate(self, nodes=None):
+        """Forgets the degrees of nodes, or of all nodes if None, so they are
+        recomputed.  Must be called with the ends of the edges added, removed
+        or reweighted since the index was made, or with None.
+        """
+        if nodes is None:
+            self.clear()
+        else:
+            for n in nodes:
+                self.pop(n, None)
@@ -3,13 +3,41 @@
 import candidates
 import community
 import copy
+import degree_index
 import math
+import multiprocessing
 import matplotlib.pyplot as plt
 import numpy as np
 
-def expand_all(graph, seeds, forced=0, maxit=-1):
+def expand_all(graph, seeds, forced=0, maxit=-1, degrees=None, workers=None,
+               progress=None, record_history=False):
     """Expands all seeds within the graph
+    
+    The weighted degrees of the nodes are kept in degrees, a DegreeIndex of
+    graph shared by all the expansions, a new one if None, which must have
+    been invalidated if the graph changed since it was filled.  If workers is
+    given the seeds are expanded by this many processes, see expand_iter.
+    After each expansion progress, print_progress if None, is called with
+    the number of expansions done and the number of seeds.
+    
+    Unless record_history, only the nodes and the bounds of each community
+    are kept, and the lists of these are returned, see expand.  Otherwise
+    the Community, Candidates and histories of every expansion are.
     """
+    if progress is None:
+        progress = print_progress
+    found = [None] * len(seeds)
+    done = 0
+    for i, expansion in expand_iter(graph, seeds, forced, maxit, degrees,
+                                    workers, record_history):
+        found[i] = expansion
+        done += 1
+        progress(done, len(seeds))
+        
+    if not record_history:
+        return [nodes for (nodes, bounds) in found], \
+               [bounds for (nodes, bounds) in found]
+        
     found_c = []
     found_cand = []
     found_closure = []
@@ -17,35 +45,104 @@ def expand_all(graph, seeds, forced=0, maxit=-1):
     found_sd = []
     found_order = []
     
-    for s in seeds:
-        if maxit < 0:
-            maxit = min(150, graph.number_of_nodes()/30.)
-            maxit = max(50, maxit)
-            
-        c, cand, order, stat_hist, sd_hist, closure_hist = expand(graph,
-                                                                  s,
-                                                                  maxit,
-                                                                  forced=forced)
+    for (c, cand, order, stat_hist, sd_hist, closure_hist) in found:
         found_c.append(c)
         found_cand.append(cand)
         found_order.append(order)
         found_stat.append(stat_hist)
         found_sd.append(sd_hist)
         found_closure.append(closure_hist)
-            
-        if len(found_c) % 100 == 0:
-            print "completed ", len(found_c), " expansions out of ", len(seeds)
         
     return found_c, found_cand, found_order, found_stat, found_sd, found_closure
+    
+    
+def print_progress(done, total):
+    """Prints the progress of expand_all every 100 expansions
+    """
+    if done % 100 == 0:
+        print "completed ", done, " expansions out of ", total
+        
+        
+def expand_iter(graph, seeds, forced=0, maxit=-1, degrees=None, workers=None,
+                record_history=True):
+    """Expands the seeds within the graph, yielding (i, expansion) as the
+    expansion of the i-th seed is done, the expansion being what expand
+    returns.
+    
+    If workers is given, the seeds are handed one at a time to this many
+    forked processes, so a big community holds up one worker only, and the
+    expansions come in the order they finish.  The workers read the graph
+    the seeds and the filled DegreeIndex of the parent, which must not
+    change while they run, and send the expansions back without the graph
+    and index.  The seeds are read rather than sent, as a set sent could be
+    gone through in another order, which expand depends on.
+    
+    record_history is that of expand.
+    """
+    global __expand_shared
+    if maxit < 0:
+        maxit = min(150, graph.number_of_nodes()/30.)
+        maxit = max(50, maxit)
+    if degrees is None:
+        degrees = degree_index.DegreeIndex(graph)
+    
+    if workers is None:
+        for i, s in enumerate(seeds):
+            yield i, expand(graph, s, maxit, forced=forced, degrees=degrees,
+                            record_history=record_history)
+        return
         
+    # fill the index before forking, rather than in every worker
+    for n in graph:
+        degrees[n]
+    seeds = list(seeds)
+    __expand_shared = (graph, seeds, degrees, maxit, forced, record_history)
+    pool = multiprocessing.Pool(workers)
+    try:
+        for i, expansion in pool.imap_unordered(__expand_task,
+                                                range(len(seeds))):
+            if record_history:
+                (cs, cand) = expansion[:2]
+                cs.degrees = degrees
+                cand.degrees = degrees
+                cand.graph = graph
+            yield i, expansion
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+        __expand_shared = None
+        
+        
+# the graph, seeds and degrees shared with the forked workers of expand_iter
+__expand_shared = None
 
-def expand(graph, subset, maxit, forced=0):
+
+def __expand_task(i):
+    """ Expands the i-th shared seed within the shared graph, and returns i
+    with the expansion, stripped of the graph and degrees
+    """
+    (graph, seeds, degrees, maxit, forced, record_history) = __expand_shared
+    expansion = expand(graph, seeds[i], maxit, forced=forced, degrees=degrees,
+                       record_history=record_history)
+    if record_history:
+        (cs, cand) = expansion[:2]
+        cs.degrees = None
+        cand.degrees = None
+        cand.graph = None
+    return i, expansion
+    
+
+def expand(graph, subset, maxit, forced=0, degrees=None, record_history=True):
     """Expands the given subset with the more likely determined by 
     Parameters
     ----------
     graph : the networkx graph
     subset : the subset to be expanded
     maxit : the maximum number of iterations or nodes to expand by
+    degrees : a DegreeIndex of graph, a new one if None
+    record_history : if False, no history is kept, for plotting, of the
+                     nodes engulfed and the community is summed up only
     
     Method
     ------
@@ -54,10 +151,15 @@ def expand(graph, subset, maxit, forced=0):
     Returns
     -------
     order : the order in which the nodes were engulfed
+    
+    If not record_history, only the set of the nodes of the community and
+    its bounds, the dictionary of 'min_e' and 'min_p', are returned.
     """
     # set up community and candidate data structures
+    if degrees is None:
+        degrees = degree_index.DegreeIndex(graph)
     cs = community.Community()
-    external_nodes = cs.init(graph, subset)
+    external_nodes = cs.init(graph, subset, degrees)
     cand = candidates.Candidates(graph, external_nodes, cs)
     cs.init_bounds(cand)
     cand.rework_fringe()
@@ -65,10 +167,14 @@ def expand(graph, subset, maxit, forced=0):
     # set up accounting data structures for experimentation
     order = list(subset)    
     m = order[-1]
-    stat_hist = [(copy.copy(cs.nodes[m]),
+    stat_hist = []
+    sd_hist = []
+    if record_history:
+        stat_hist.append((copy.copy(cs.nodes[m]),
                           cand.stat_import(cs.nodes[m]),
-                          cand.stats_string())]
-    sd_hist = [cand.stat_import(cs.nodes[m])[cs.nodes[m]['reason']]]
+                          cand.stats_string()))
+        sd_hist.append(cand.stat_import(cs.nodes[m])[cs.nodes[m]['reason']])
+    # kept either way, for cut_last_closure
     closure_hist = [closure(cs, cand)]
     
     count = 0
@@ -93,10 +199,11 @@ def expand(graph, subset, maxit, forced=0):
         else:
             print "BUG (?) in EXPAND"
             
-        stat_hist.append((copy.copy(cs.nodes[m]),
-                          cand.stat_import(cs.nodes[m]),
-                          cand.stats_string()))
-        sd_hist.append(cand.stat_import(cs.nodes[m])[cs.nodes[m]['reason']])
+        if record_history:
+            stat_hist.append((copy.copy(cs.nodes[m]),
+                              cand.stat_import(cs.nodes[m]),
+                              cand.stats_string()))
+            sd_hist.append(cand.stat_import(cs.nodes[m])[cs.nodes[m]['reason']])
         closure_hist.append(closure(cs, cand))
             
         count += 1
@@ -108,6 +215,8 @@ def expand(graph, subset, maxit, forced=0):
     print "         With Closure: ", closure(cs, cand), " With ", len(cs.nodes), " nodes."
     print "         The standard deviation away for e is: ", imp['e'], " and p: ", imp['p']
     """
+    if not record_history:
+        return set(cs.nodes), dict(cs.bounds)
     return cs, cand, order, stat_hist, sd_hist, closure_hist
 
 
@@ -118,8 +227,9 @@ def cut_last_closure(graph, order, cs, cand, closure_history):
         closure_history.reverse()
         cut = closure_history.index(min(closure_history))
         closure_history.reverse()
+        degrees = cs.degrees
         cs = community.Community()
-        external_nodes = cs.init(graph, order[:-cut])
+        external_nodes = cs.init(graph, order[:-cut], degrees)
         cand = candidates.Candidates(graph, external_nodes, cs)
         cs.init_bounds(cand)
         cand.rework_fringe()
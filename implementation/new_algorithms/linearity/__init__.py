@@ -2,9 +2,11 @@
 
 
 from arrangement import *
+from arrangement_arrays import *
 from linear_overlap import *
 from linearity_partition import *
 
 import arrangement
+import arrangement_arrays
 import linear_overlap
 import linearity_partition
\ No newline at end of file
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+
+import array
+
+import CommunityDetection as CD
+import numpy as np
+
+
+class ArrayBar :
+    """ A Bar whose bottles are kept in flat arrays rather than Bottles.
+
+    The nodes of the graph are relabelled 0..n-1 in graph.nodes() order and
+    the bottle of node i starts as bottle i, named by node i, so the names
+    handled by shift, swap, bottle_containing and nodes_to_bottles are the
+    same as the ones of Bar.  The fields of the bottles are parallel arrays
+    indexed by bottle id, so finding the bottle of a node is O(1) and moving
+    a node costs O(degree), whatever the size of the bottles.
+
+    The weight from each node to each bottle it touches is cached and
+    updated by swap, so shift only looks at the bottles around a node, not
+    at its edges.
+
+    Parameters
+    ---------
+    graph       : a networkx weighted graph, with a 'size' for each node
+    n           : a node of the graph
+    b1          : a bottle that n is currently in
+    b2          : a bottle that n will be put in
+
+    Fields
+    ------
+    nodes       : the node of each id
+    ids         : a dictionary mapping nodes to their id
+    ntob        : the id of the bottle of each node id
+    size        : the size of each bottle
+    bintedges   : the internal edges of each bottle
+    bextedges   : the external edges of each bottle
+    neighbor_bottles : for each node id, a dictionary of the weight from the
+                  node to each bottle it touches, by bottle name
+    joined      : for each node id, the number of the swap that put it in
+                  its bottle, 0 for its first one, so the members of a
+                  bottle are in the order of Bottle.contains
+    intedges    : the number of internal edges across the bar
+    idealint    : the number int edges should all bottles be cliques
+    extedges    : the number of external edges across the bar
+    s           : the number of non-empty bottles
+
+    Methods
+    -------
+    shift       : returns the best bottle to put a node in
+    test_swap   : returns the change of the metric swapping a node
+    swap        : actually swaps a node between bottles
+    bottle_neighbors : creates the list of bottles a node is connected to
+    lin_metric  : computes the metric value of the current configuration
+
+    """
+
+    def __init__(self, graph, numedges, __A, __B, __C, csr=None):
+        """ Creates a set of bottles that each contain 1 node
+
+        The graph may be None if csr, the (nodes, indptr, indices, weights,
+        sizes) arrays of the graph such as the ones of compress_arrays, is
+        given instead.
+        """
+        if csr is None:
+            nodes, indptr, indices, weights = CD.graph_to_csr(graph)
+            nsize = np.array([graph.node[n]['size'] for n in nodes],
+                             dtype=np.float64)
+        else:
+            nodes, indptr, indices, weights, nsize = csr
+        self.nodes = nodes
+        self.ids = dict(zip(nodes, range(len(nodes))))
+        self.idealext = float(numedges)
+        self.__A = __A
+        self.__B = __B
+        self.__C = __C
+
+        num_nodes = len(nodes)
+        rows = np.repeat(np.arange(num_nodes), np.diff(indptr))
+        isloop = rows == indices
+        loops = np.bincount(rows[isloop], weights[isloop],
+                            minlength=num_nodes)
+        degrees = np.bincount(rows[~isloop], weights[~isloop],
+                              minlength=num_nodes)
+
+        self.indptr = array.array('l', indptr.tolist())
+        self.indices = array.array('l', indices.tolist())
+        self.weights = array.array('d', weights.tolist())
+        self.loops = array.array('d', loops.tolist())
+        self.degrees = array.array('d', degrees.tolist())
+        self.nsize = array.array('d', nsize.tolist())
+
+        self.ntob = array.array('l', range(num_nodes))
+        self.joined = array.array('l', [0]) * num_nodes
+        self.num_joins = 0
+        self.size = array.array('d', nsize.tolist())
+        self.bintedges = array.array('d', (2 * loops).tolist())
+        self.bextedges = array.array('d', degrees.tolist())
+
+        self.neighbor_bottles = [dict() for i in xrange(num_nodes)]
+        for i in xrange(num_nodes):
+            en = self.neighbor_bottles[i]
+            for index in xrange(self.indptr[i], self.indptr[i + 1]):
+                j = self.indices[index]
+                if j != i:
+                    en[nodes[j]] = en.get(nodes[j], 0.) + self.weights[index]
+
+        self.intedges = float(2 * loops.sum())
+        self.extedges = float(degrees.sum())
+        self.idealint = float(np.sum(nsize * (nsize - 1)))
+        self.s = num_nodes
+
+    def __str__(self):
+        barstr =  "ArrayBar with internal edges: "+ str(self.intedges) + "\n" + \
+                  "         external edges: "+ str(self.extedges) + "\n" + \
+                  "         ideal int edges: "+ str(self.idealint) + "\n" + \
+                  "         ideal ext edges: "+ str(self.idealext) + "\n" + \
+                  "         non-empty bottles: "+ str(self.s) + "\n" + \
+                  "         a: " + str(self.__A) + "\n" + \
+                  "         b: " + str(self.__B) + "\n" + \
+                  "         c: " + str(self.__C) + "\n"
+
+        return barstr
+
+
+    def get_I_E_S(self):
+        """ Returns the I(S), E(S), and |S| value of the bar
+        """
+        return self.intedges/self.idealint, self.extedges/self.idealext, self.s
+
+
+    def shift(self, graph, n, cached=True):
+        """Finds the best spot to put n.
+
+        Same as Bar.shift, graph is only there for compatibility.  If not
+        cached, the weights from n to the bottles are recomputed from its
+        edges, for copies of the bar whose cache is not kept up to date.
+
+        Returns
+        -------
+        bestbname : the name of the best bottle to put n in
+        """
+        i = self.ids[n]
+        if cached:
+            return self.__best_bottle(i, self.neighbor_bottles[i])
+        return self.__best_bottle(i, self.__bottle_weights(i), True)
+
+
+    def __bottle_weights(self, i):
+        """ Returns the weight from node id i to each bottle it touches, from
+        its edges and the bottle of each node, in a dictionary filled in the
+        order of Bar.shift, so it is gone through in the same order
+        """
+        nodes = self.nodes
+        ntob = self.ntob
+        indices = self.indices
+        weights = self.weights
+        en = {nodes[ntob[i]]: 0.}
+        for index in xrange(self.indptr[i], self.indptr[i + 1]):
+            j = indices[index]
+            if j != i:
+                b = nodes[ntob[j]]
+                en[b] = en.get(b, 0.) + weights[index]
+        return en
+
+
+    def __best_bottle(self, i, en, ordered=False):
+        """ Returns the name of the best bottle for node id i, given its
+        weight to each bottle name it touches
+
+        As in Bar.shift, of the bottles improving the metric the most, the
+        first one gone through is taken.  The cached weights are not in the
+        order of Bar.shift, so if bottles tie, unless en is ordered, they are
+        gone through again in the order of __bottle_weights.
+        """
+        ids = self.ids
+        size = self.size
+        bhome = self.nodes[self.ntob[i]]
+        bestb = bhome
+        bestimprovement = 0.
+
+        # find the change in number of communities
+        deltasize = self.nsize[i]
+        homesize = size[ids[bhome]]
+        cmod = 0
+        if deltasize == homesize:
+            cmod = -1 * self.__C
+
+        bmod = 2 * self.__B / self.idealext
+
+        # makes finding the change in internal density easier
+        ibefore = self.__A
+        if self.idealint > 0:
+            ibefore = self.__A * self.intedges / self.idealint
+
+        homeweight = en.get(bhome, 0.)
+        itop = self.intedges - 2 * homeweight
+        ibottom = self.idealint - homesize * (homesize - 1) \
+                  + (homesize - deltasize) * (homesize - deltasize - 1)
+
+        tied = False
+        for b, weight in en.iteritems():
+            if b != bhome:
+                currentsize = size[ids[b]]
+                newitop = itop + 2 * weight
+                newibottom = ibottom - currentsize * (currentsize - 1) \
+                             + (currentsize + deltasize) \
+                             * (currentsize + deltasize - 1)
+
+                improvement = self.__A * newitop / newibottom - ibefore\
+                              - bmod * (homeweight - weight)\
+                              - cmod
+
+                if improvement > bestimprovement:
+                    bestb = b
+                    bestimprovement = improvement
+                    tied = False
+                elif improvement == bestimprovement and bestb != bhome:
+                    tied = True
+
+        if tied and not ordered:
+            return self.__best_bottle(i, self.__bottle_weights(i), True)
+        return bestb
+
+
+    def test_swap(self, graph, n, b1, b2):
+        """Tests the changes that would occur moving n from b1 to b2
+
+        Returns
+        -------
+        delta : the change of the metric
+        """
+        if self.bottle_containing(n) != b1:
+            raise Exception("tried to test an invalid move of node from bottle")
+
+        stay = self.lin_metric()
+        self.swap(graph, n, b1, b2)
+
+        go = self.lin_metric()
+        self.swap(graph, n, b2, b1)
+
+        return go - stay
+
+
+    def swap(self, graph, n, b1, b2):
+        """ Swaps the node n from bottle b1 to b2
+        """
+        i = self.ids[n]
+        b1 = self.ids[b1]
+        b2 = self.ids[b2]
+        if self.ntob[i] != b1:
+            raise Exception("Tried to remove a non-member," + str(n) + \
+                            " from Bottle: " + str(self.nodes[b1]))
+        # n goes to the end of the members of b2, even if b2 is b1
+        self.num_joins += 1
+        self.joined[i] = self.num_joins
+        if b1 == b2:
+            return
+
+        name1 = self.nodes[b1]
+        name2 = self.nodes[b2]
+        en = self.neighbor_bottles
+        w1 = en[i].get(name1, 0.)
+        w2 = en[i].get(name2, 0.)
+        self.__move(i, b1, b2, w1, w2)
+
+        # n now brings its links to its neighbours from b1 to b2
+        indices = self.indices
+        weights = self.weights
+        for index in xrange(self.indptr[i], self.indptr[i + 1]):
+            j = indices[index]
+            if j != i:
+                weight = en[j][name1] - weights[index]
+                if weight > 1e-9:
+                    en[j][name1] = weight
+                else:
+                    del en[j][name1]
+                en[j][name2] = en[j].get(name2, 0.) + weights[index]
+
+
+    def __move(self, i, b1, b2, w1, w2):
+        """ Moves node id i from bottle id b1 to b2, i having links of weight
+        w1 to the other members of b1 and w2 to the ones of b2
+        """
+        size = self.size
+        loop = self.loops[i]
+        degree = self.degrees[i]
+        deltasize = self.nsize[i]
+
+        self.intedges -= (self.bintedges[b1] + self.bintedges[b2])
+        self.extedges -= (self.bextedges[b1] + self.bextedges[b2])
+        self.idealint -= size[b1] * (size[b1] - 1) + size[b2] * (size[b2] - 1)
+
+        self.bintedges[b1] -= 2 * (w1 + loop)
+        self.bextedges[b1] += 2 * w1 - degree
+        size[b1] -= deltasize
+        if size[b1] == 0:
+            self.s -= 1
+
+        if size[b2] == 0:
+            self.s += 1
+        self.bintedges[b2] += 2 * (w2 + loop)
+        self.bextedges[b2] += degree - 2 * w2
+        size[b2] += deltasize
+
+        self.ntob[i] = b2
+
+        self.intedges += (self.bintedges[b1] + self.bintedges[b2])
+        self.extedges += (self.bextedges[b1] + self.bextedges[b2])
+        self.idealint += size[b1] * (size[b1] - 1) + size[b2] * (size[b2] - 1)
+
+
+    def bottle_containing(self, n):
+        """ Returns the name of the bottle containing n
+        """
+        return self.nodes[self.ntob[self.ids[n]]]
+
+
+    def bottle_neighbors(self, graph, n):
+        """ Returns the names of all bottles n is connected to.
+        """
+        i = self.ids[n]
+        bottles = self.neighbor_bottles[i].keys()
+        if self.loops[i] > 0 and self.bottle_containing(n) not in bottles:
+            bottles.append(self.bottle_containing(n))
+        return bottles
+
+
+    def nodes_to_bottles(self):
+        """Creates the mapping of nodes of the graph to their storage bottles.
+
+        The mapping is filled in the order of Bar.nodes_to_bottles, bottle by
+        bottle in the order of the dictionary of the bottles of a Bar, and
+        member by member in the order they joined.
+        """
+        nodes = self.nodes
+        members = [[] for n in nodes]
+        for i in sorted(xrange(len(nodes)), key=self.joined.__getitem__):
+            members[self.ntob[i]].append(nodes[i])
+
+        # a Bar fills the dictionary of its bottles in the order of its nodes
+        bottles = {}
+        for (b, n) in enumerate(nodes):
+            bottles[n] = b
+
+        mapping = {}
+        for (n, b) in bottles.iteritems():
+            for m in members[b]:
+                mapping[m] = n
+        return mapping
+
+
+    def lin_metric(self):
+        """Returns the current metric evaluation of the bar
+        """
+        if self.idealint == 0.:
+            first = 1.
+        else:
+            first = self.intedges / self.idealint
+
+        return self.__A * first \
+               - self.__B * self.extedges / self.idealext \
+               - self.__C * self.s
+
+
+    def change_ideal(self, size, delta):
+        """ let size1 be the original size and size 2 be the new size of
+community
+        """
+        return -size * (size - 1) + (size + delta) * (size + delta - 1)
@@ -1,76 +1,206 @@
 
 import CommunityDetection as CD
+import multiprocessing
+import numpy as np
 
-def linear_expand(graph, sets, __A, __B, __C):
+def linear_expand(graph, sets, __A, __B, __C, workers=None, staleness=None):
     """ Given the sets, expands the sets to include nodes as long as inc metric
+    
+    The graph is held in CSR arrays and every edge has an id, so whether an
+    edge is still external is a flag in a bytearray, and the nodes linked
+    to a community are tried by decreasing number of links from an int
+    count, rather than from sets and lists of edges.
+    
+    The sets are expanded one after the other, each seeing the counts left
+    by the previous ones.  If workers is given, they are expanded by this
+    many processes instead, in batches of staleness sets (all of them if
+    None): the sets of a batch all see the counts as they were at its
+    start, and their changes are merged into the counts in the order of
+    sets at its end.  A staleness of 1 gives the sequential result, and for
+    any staleness the result does not depend on the number of workers.
     """
+    global __expand_shared
     __B = __B / float(graph.number_of_edges())
+    nodes, indptr, indices, weights = CD.graph_to_csr(graph)
+    ids = dict(zip(nodes, range(len(nodes))))
+    edges = get_edge_ids(indptr, indices).tolist()
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+    
     # initialize counts for the set of communities
-    (n_int_edges, base_int_edges, ext_edges) = get_int_counts(graph, sets)
-    for c in sets:
-        # initialize counts for the single community
-        connected = get_connected_counts(graph, c)   
-        inc = 1.
-        while inc > 0:
-            # find and test the best node, v
-            v = get_best_connected(connected)
-            if v == None:
-                break
-            
-            new_int_den = (n_int_edges + len(connected[v])) \
-                           / float(base_int_edges + 2 * len(c))
-            old_int_den = n_int_edges / float(base_int_edges)
-            delta_i = new_int_den - old_int_den
-            delta_e = len(ext_edges.intersection(set(connected[v])))
-            inc = __A * delta_i + __B * delta_e
-            if inc > 0:
-                n_int_edges += len(connected[v])
-                base_int_edges += 2 * len(c)
-                ext_edges -= set(connected[v])
-                c.update([v])
-                connected.pop(v)
+    (n_int_edges, base_int_edges, external) = get_int_counts(indptr, indices,
+                                                             edges, ids, sets)
+    members = [[ids[n] for n in c] for c in sets]
+    
+    if workers is None:
+        in_c = bytearray(len(nodes))
+        for (c, c_members) in zip(sets, members):
+            expansion = expand_community(indptr, indices, edges, external,
+                                         in_c, c_members, n_int_edges,
+                                         base_int_edges, __A, __B)
+            (n_int_edges, base_int_edges) = __merge(c, nodes, external,
+                                                    expansion, n_int_edges,
+                                                    base_int_edges)
+        return sets
+        
+    # the forked workers read the external flags as merged so far
+    external = multiprocessing.RawArray('B', list(external))
+    __expand_shared = (indptr, indices, edges, external, __A, __B)
+    if staleness is None:
+        staleness = max(len(sets), 1)
+    pool = multiprocessing.Pool(workers)
+    try:
+        for start in range(0, len(sets), staleness):
+            batch = range(start, min(start + staleness, len(sets)))
+            tasks = [(members[k], n_int_edges, base_int_edges) for k in batch]
+            expansions = pool.map(__expand_task, tasks)
+            for (k, expansion) in zip(batch, expansions):
+                (n_int_edges, base_int_edges) = __merge(sets[k], nodes,
+                                                        external, expansion,
+                                                        n_int_edges,
+                                                        base_int_edges)
+    finally:
+        pool.close()
+        pool.join()
+        __expand_shared = None
     
     return sets
 
 
-def get_int_counts(graph, sets):
+def expand_community(indptr, indices, edges, external, in_c, members,
+                     n_int_edges, base_int_edges, __A, __B):
+    """ Expands a single community as long as inc metric, against the counts
+    
+    Parameters
+    ----------
+    indptr, indices : the CSR lists of the graph
+    edges : the edge id of each entry of indices
+    external : the flags of the edges external to all sets, by edge id
+    in_c : a zeroed bytearray of a flag per node, handed back zeroed
+    members : the node ids of the community
+    n_int_edges, base_int_edges : the internal edges of the sets and the
+                                  number they would be were they cliques
+    
+    Returns
+    -------
+    added : the node ids added to the community, in order
+    int_edges, base_edges : what n_int_edges and base_int_edges grow by
+    cleared : the ids of the edges which are no longer external
+    """
+    for n in members:
+        in_c[n] = 1
+    (connected, order) = get_connected_counts(indptr, indices, in_c, members)
+    added = []
+    cleared = []
+    int_edges = 0
+    base_edges = 0
+    size = len(members)
+    for v in order:
+        # test the best node left, v
+        new_int_den = (n_int_edges + int_edges + 2 * connected[v]) \
+                       / float(base_int_edges + base_edges + 2 * size)
+        old_int_den = (n_int_edges + int_edges) \
+                      / float(base_int_edges + base_edges)
+        delta_i = new_int_den - old_int_den
+        v_edges = [edges[e] for e in xrange(indptr[v], indptr[v + 1])
+                   if in_c[indices[e]]]
+        delta_e = sum([external[e] for e in v_edges])
+        inc = __A * delta_i + __B * delta_e
+        if inc <= 0:
+            break
+            
+        int_edges += 2 * connected[v]
+        base_edges += 2 * size
+        cleared.extend(v_edges)
+        added.append(v)
+        size += 1
+        
+    for n in members:
+        in_c[n] = 0
+        
+    return added, int_edges, base_edges, cleared
+    
+    
+def __merge(c, nodes, external, expansion, n_int_edges, base_int_edges):
+    """ Adds the nodes of an expansion to c, clears its edges from external
+    and returns the new n_int_edges and base_int_edges
+    """
+    (added, int_edges, base_edges, cleared) = expansion
+    for e in cleared:
+        external[e] = 0
+    c.update([nodes[v] for v in added])
+    return n_int_edges + int_edges, base_int_edges + base_edges
+    
+    
+# the graph and flags shared with the forked workers of linear_expand
+__expand_shared = None
+
+
+def __expand_task(task):
+    """ Expands the community of the task against the shared graph and its
+    counts, see expand_community
+    """
+    (members, n_int_edges, base_int_edges) = task
+    (indptr, indices, edges, external, __A, __B) = __expand_shared
+    in_c = bytearray(len(indptr) - 1)
+    return expand_community(indptr, indices, edges, external, in_c, members,
+                            n_int_edges, base_int_edges, __A, __B)
+
+
+def get_edge_ids(indptr, indices):
+    """ Gives every edge of a CSR graph an id, and returns the id of the edge
+    of each entry of indices, the two entries of an edge sharing it
+    """
+    num_nodes = len(indptr) - 1
+    rows = np.repeat(np.arange(num_nodes, dtype=np.int64), np.diff(indptr))
+    cols = indices.astype(np.int64)
+    keys = np.minimum(rows, cols) * num_nodes + np.maximum(rows, cols)
+    return np.unique(keys, return_inverse=True)[1]
+
+
+def get_int_counts(indptr, indices, edges, ids, sets):
     """ Finds the initial values of the internal and external densities
+    
+    Returns the number of internal edges, seen from both ends, the number
+    they would be were all sets cliques, and a bytearray flagging by id the
+    edges external to all sets.
     """
     n_int_edges = 0
     base_int_edges = 0
-    ext_edges = set(graph.edges())
+    external = bytearray([1]) * (max(edges) + 1 if len(edges) > 0 else 0)
+    in_c = bytearray(len(indptr) - 1)
     for c in sets:
-        c_int_edges = CD.get_internal_edges(graph, c)
-        ext_edges -= set(c_int_edges)
-        n_int_edges += len(c_int_edges)
+        members = [ids[n] for n in c]
+        for n in members:
+            in_c[n] = 1
+        for n in members:
+            for e in xrange(indptr[n], indptr[n + 1]):
+                if in_c[indices[e]]:
+                    n_int_edges += 1
+                    external[edges[e]] = 0
+        for n in members:
+            in_c[n] = 0
         base_int_edges += len(c) * (len(c) - 1)
     
-    return n_int_edges, base_int_edges, ext_edges
+    return n_int_edges, base_int_edges, external
  
  
-def get_connected_counts(graph, c):
-    """ Creates a dictionary keyed on nodes connected to c valued on {E(n, c)}
-    Note: each edge is added twice to the connected
+def get_connected_counts(indptr, indices, in_c, members):
+    """ Counts the links to the community of every node linked to it
+    
+    Returns a dictionary keyed on node ids connected to the community valued
+    on |E(n, c)|, and these node ids by decreasing count, ties in the order
+    they were met.
     """
     connected = {}
-    for n in c:
-        for m in graph.neighbors(n):
-            if m not in c:
+    order = []
+    for n in members:
+        for m in indices[indptr[n]:indptr[n + 1]]:
+            if not in_c[m]:
                 if m not in connected:
-                    connected[m] = []
-                connected[m].extend([(n, m), (m, n)])
+                    connected[m] = 0
+                    order.append(m)
+                connected[m] += 1
                 
-    return connected
-
-
-def get_best_connected(connected):
-    """ Finds the best node to add in connected
-    """
-    n = None
-    connectivity = -1
-    for (m, conn) in connected.iteritems():
-        if len(conn) > connectivity:
-            n = m
-            connectivity = len(conn)
-            
-    return n
\ No newline at end of file
+    order.sort(key=lambda m: -connected[m])
+    return connected, order
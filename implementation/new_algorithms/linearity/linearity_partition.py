@@ -1,11 +1,22 @@
 # -*- coding: utf-8 -*-
 
 
+import array
+import heapq
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import CommunityDetection as CD
 import networkx as nx
+import numpy as np
 
 from arrangement import Bar
+from arrangement_arrays import ArrayBar
 
-def linearity_run(graph, __A, __B, __C):
+def linearity_run(graph, __A, __B, __C, engine="dict", workers=None,
+                  continuation=False, seeding="sorted", spill=None):
     """Computes the best linearity based metric for partitioning the graph.
     Parameters
     ---------
@@ -13,6 +24,18 @@ def linearity_run(graph, __A, __B, __C):
     a : the constant weighting of I(C)
     b : the constant weighting of E(C)
     c : the constant weighting of |S|
+    engine : "dict" to keep the bottles in a Bar, "array" in an ArrayBar,
+             which is much faster once bottles get big
+    workers : with the "array" engine, the number of processes the moves
+              of shell_game are evaluated by, see shell_game
+    continuation : if True, the steps of the weighting of E(C) are skipped
+                   once shell_game moves no node, as they would all give
+                   the same bar, see create_dendogram_linear
+    seeding : "sorted" to start from the maximal cliques by decreasing size,
+              as clique_game, or "streaming" to start from the cliques of
+              stream_clique_game, which holds far less in memory
+    spill : if given, a directory the levels of the dendogram are written
+            to and read back from, see create_dendogram_linear
     
     Returns
     -------
@@ -26,66 +49,321 @@ def linearity_run(graph, __A, __B, __C):
     """
     
     # create the dendogram
-    dendo = create_dendogram_linear(graph.copy(), __A, __B, __C)
+    dendo, names = __dendogram_linear(graph.copy(), __A, __B, __C, engine,
+                                      workers, continuation, seeding, True,
+                                      spill)
     
-    # traces the final community by marching through the dendo's heirarchy
-    partition = dendo[0].copy()
-    for level in range(1, len(dendo)) :
-        for n in partition:
-            partition[n] = dendo[level][partition[n]]
-            
-    return partition
+    # traces the final community by composing the dendo's levels
+    partition = dendo.partition_array(len(dendo) - 1).tolist()
+    return dict(zip(dendo.nodes, [names[c] for c in partition]))
     
     
-def create_dendogram_linear(graph, __A, __B, __C):
+def create_dendogram_linear(graph, __A, __B, __C, engine="dict",
+                            workers=None, continuation=False,
+                            seeding="sorted", compact=False, spill=None):
     """ Creates the dendogram according to the paper
+    
+    engine chooses the Bar, "dict" or "array", workers the processes of
+    shell_game and seeding the first cliques, see linearity_run.
+    
+    When a level stops improving, b is raised by a hundredth of __B and
+    shell_game run again, but the bar keeps the b it was built with, so
+    once shell_game moves no node, every later step would give the same
+    bar.  If continuation, the steps left are then skipped, which gives
+    the same levels.
+    
+    If compact, the dendogram is an ArrayDendogram, holding the bottle of
+    every node of a level as an int32 array indexing the next level, rather
+    than a list of dictionaries keyed by the names of the nodes and
+    bottles.  If spill is also given, the level arrays are written to a new
+    directory in it as they are made, and only kept as np.memmap views.  The
+    directory is removed when the dendogram is made, the views still reading
+    the removed files.  Giving spill without compact raises a ValueError.
+    """
+    return __dendogram_linear(graph, __A, __B, __C, engine, workers,
+                              continuation, seeding, compact, spill)[0]
+    
+    
+def __dendogram_linear(graph, __A, __B, __C, engine, workers, continuation,
+                       seeding, compact, spill):
+    """ Creates the dendogram of create_dendogram_linear, and returns it with
+    the names of the bottles of its last level, numbered as in its arrays,
+    if compact, or None
+    """
+    if seeding == "sorted":
+        seed_game = clique_game
+    elif seeding == "streaming":
+        seed_game = stream_clique_game
+    else:
+        raise ValueError("Unknown seeding: " + str(seeding))
+        
+    if engine == "dict":
+        bar_class = Bar
+        if workers is not None:
+            raise ValueError("The dict engine is sequential, " + \
+                             "use engine='array'")
+    elif engine == "array":
+        bar_class = ArrayBar
+    else:
+        raise ValueError("Unknown engine: " + str(engine))
+        
+    if spill is not None and not compact:
+        raise ValueError("Only a compact dendogram can be spilled, " + \
+                         "use compact=True")
+        
+    if spill is None:
+        return __dendogram_levels(graph, __A, __B, __C, bar_class, seed_game,
+                                  workers, continuation, compact, None)
+        
+    # a directory of the run's own, so runs sharing spill do not write over
+    # each other's levels, removed once they are made : the memmaps keep the
+    # pages of the removed files
+    spill = tempfile.mkdtemp(dir=spill)
+    try:
+        return __dendogram_levels(graph, __A, __B, __C, bar_class, seed_game,
+                                  workers, continuation, compact, spill)
+    finally:
+        shutil.rmtree(spill)
+        
+        
+def __dendogram_levels(graph, __A, __B, __C, bar_class, seed_game, workers,
+                       continuation, compact, spill):
+    """ Makes the levels of __dendogram_linear, spilling them to the
+    directory spill if it is not None
     """
-    delta = __B / 100.
-    temp_b = 0.
     nedges = 2. * graph.number_of_edges()
     
-    bar = Bar(graph, nedges, __A, __B, __C)
+    bar = bar_class(graph, nedges, __A, __B, __C)
     
-    dendo = [bar.nodes_to_bottles()]
+    names = None
+    if compact:
+        nodes = graph.nodes()
+        dendo = [np.arange(len(nodes), dtype=np.int32)]
+    else:
+        dendo = [bar.nodes_to_bottles()]
     
     lin = bar.lin_metric()
     
     # This if for starting from maximal cliques
-    clique_game(graph, bar)
-    dendo.append(bar.nodes_to_bottles())
-    new_graph = compress_graph(graph, bar)
-    del(bar)
-    del(graph)
-    graph = new_graph
-    bar = Bar(graph, nedges, __A, temp_b, __C)
+    seed_game(graph, bar)
+    if compact:
+        level, names = level_array(bar, nodes)
+        dendo.append(level)
+    else:
+        dendo.append(bar.nodes_to_bottles())
+    graph, bar = __compress(graph, bar, bar_class, nedges, __A, 0., __C)
+    
+    if spill is not None:
+        dendo = [__spill(level, spill, i) for (i, level) in enumerate(dendo)]
+    levels, ies, names = __linear_levels(graph, bar, bar_class, nedges, lin,
+                                         __A, __B, __C, workers,
+                                         continuation, names, spill)
+    if not compact:
+        return dendo + levels, None
+    return CD.ArrayDendogram(dendo + levels, nodes), names
+    
+    
+def level_array(bar, names):
+    """ Returns the bottle of each of the names as an int32 array, and the
+    names of the non-empty bottles, in the order they are numbered in it.
+    
+    Parameters
+    ----------
+    bar : a Bar or an ArrayBar
+    names : the nodes of the graph of bar, in the order its bottles were
+            numbered at the level before
+    
+    Returns
+    -------
+    level : the int32 array of the number of the bottle of each name
+    bottles : the names of the bottles, the nodes of the compressed graph
+    """
+    if isinstance(bar, ArrayBar):
+        ids = np.array([bar.ids[n] for n in names], dtype=np.int64)
+        bottles, level = np.unique(np.array(bar.ntob)[ids],
+                                   return_inverse=True)
+        return (level.astype(np.int32), [bar.nodes[b] for b in bottles])
+        
+    mapping = bar.nodes_to_bottles()
+    numbers = {}
+    level = np.empty(len(names), dtype=np.int32)
+    for (i, n) in enumerate(names):
+        level[i] = numbers.setdefault(mapping[n], len(numbers))
+    return level, sorted(numbers, key=numbers.get)
+    
+    
+def __spill(level, spill, index):
+    """ Writes the int32 level to the directory spill and returns it read
+    back as a read only np.memmap
+    """
+    filename = os.path.join(spill, "level_" + str(index) + ".int32")
+    mapped = np.memmap(filename, dtype=np.int32, mode="w+",
+                       shape=(len(level),))
+    mapped[:] = level
+    mapped.flush()
+    del(mapped)
+    return np.memmap(filename, dtype=np.int32, mode="r",
+                     shape=(len(level),))
+    
+    
+def __linear_levels(graph, bar, bar_class, nedges, lin, __A, __B, __C,
+                    workers, continuation, names=None, spill=None):
+    """ Runs the shell games of create_dendogram_linear from the bar of the
+    seeded graph, built with b = 0, lin being the metric of the graph before
+    seeding.  Returns the mapping of each level, the I(S), E(S) and |S| of
+    the bar of the last level and the names of its bottles.
+    
+    If names, the names of the nodes of graph, is given the mappings are
+    the arrays of level_array, written to spill if it is given, rather
+    than dictionaries.
+    """
+    delta = __B / 100.
+    temp_b = 0.
+    levels = []
+    ies = __I_E_S(bar)
+    # the levels of dendo before the first one made here
+    first = 2
     
     changed = True    
     while changed and temp_b <= __B:
         changed = False
         
-        shell_game(graph, bar)
+        moved = shell_game(graph, bar, workers)
         newlin = bar.lin_metric()
         
         if newlin > lin:
             changed = True
             lin = newlin
             
-            dendo.append(bar.nodes_to_bottles())
-            new_graph = compress_graph(graph, bar)
-            del(bar)
-            del(graph)
-            graph = new_graph
-            bar = Bar(graph, nedges, __A, temp_b, __C)
+            if names is None:
+                levels.append(bar.nodes_to_bottles())
+            else:
+                level, names = level_array(bar, names)
+                if spill is not None:
+                    level = __spill(level, spill, first + len(levels))
+                levels.append(level)
+            graph, bar = __compress(graph, bar, bar_class, nedges, __A,
+                                    temp_b, __C)
+            ies = __I_E_S(bar)
             
             print "Had another improvement with ", temp_b
             (I, E, S) = bar.get_I_E_S()
             print "    Now at I(S):", I, " E(S) ", E, " |S| ",S   
             
+        elif continuation and not moved:
+            # the bar is left as it is by the steps of b
+            break
+            
         else:
             temp_b += delta
             changed = True
             
-    return dendo
+    return levels, ies, names
+    
+    
+def __I_E_S(bar):
+    """ Returns the I(S), E(S), and |S| of the bar, I(S) being 1 if no
+    bottle holds more than a node, as in lin_metric
+    """
+    first = 1.
+    if bar.idealint > 0:
+        first = bar.intedges / bar.idealint
+    return first, bar.extedges / bar.idealext, bar.s
+    
+    
+def linearity_grid(graph, params, workers=None, continuation=False,
+                   seeding="sorted"):
+    """Runs linearity_run over a grid of weightings, seeding only once.
+    
+    The cliques the nodes start from and the compressed graph of the second
+    level do not depend on the weightings, so they are computed once, in
+    arrays, and the forked worker processes run the levels of each (a, b, c)
+    from these shared arrays with an ArrayBar.
+    
+    Parameters
+    ----------
+    graph : a networkx graph, with a 'size' for each node and a 'weight' for
+            each edge
+    params : a list of (a, b, c) weightings
+    workers : if given, the number of processes the weightings are split over
+    continuation, seeding : as in linearity_run
+    
+    Returns
+    -------
+    table : a list of (a, b, c, partition, I(S), E(S), |S|), one per
+            weighting in the order of params, the partition being a
+            dictionary of which nodes belong to which community
+    """
+    global __grid_shared
+    if seeding == "sorted":
+        seed_game = clique_game
+    elif seeding == "streaming":
+        seed_game = stream_clique_game
+    else:
+        raise ValueError("Unknown seeding: " + str(seeding))
+        
+    # the node order of the copy linearity_run works on, for the same ties
+    graph = graph.copy()
+    nedges = 2. * graph.number_of_edges()
+    bar = ArrayBar(graph, nedges, 1., 1., 1.)
+    base = __I_E_S(bar)
+    seed_game(graph, bar)
+    seeded = bar.nodes_to_bottles()
+    __grid_shared = (compress_arrays(bar), nedges, base, continuation)
+    del(bar)
+    
+    params = [tuple(param) for param in params]
+    if workers is None or workers <= 1:
+        results = map(__grid_run, params)
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(__grid_run, params)
+        finally:
+            pool.close()
+            pool.join()
+    __grid_shared = None
+    
+    table = []
+    for ((a, b, c), (top, (I, E, S))) in zip(params, results):
+        partition = dict([(n, top[seeded[n]]) for n in seeded])
+        table.append((a, b, c, partition, I, E, S))
+    return table
+    
+    
+# the seeded arrays shared with the forked workers of linearity_grid
+__grid_shared = None
+
+
+def __grid_run(param):
+    """ Runs the levels of linearity_run for the weightings param from the
+    shared seeded arrays, and returns the community of each seeded bottle
+    with the I(S), E(S) and |S| of the result
+    """
+    csr, nedges, base, continuation = __grid_shared
+    (__A, __B, __C) = param
+    lin = __A * base[0] - __B * base[1] - __C * base[2]
+    bar = ArrayBar(None, nedges, __A, 0., __C, csr=csr)
+    levels, ies, names = __linear_levels(None, bar, ArrayBar, nedges, lin,
+                                         __A, __B, __C, None, continuation)
+    
+    top = dict([(n, n) for n in csr[0]])
+    for level in levels:
+        for n in top:
+            top[n] = level[top[n]]
+    return top, ies
+    
+    
+def __compress(graph, bar, bar_class, nedges, __A, __B, __C):
+    """ Compresses the graph along the bottles of bar and returns the new
+    graph and a new bar of the class bar_class over it.  An ArrayBar is
+    compressed by compress_arrays and the new graph is then None.
+    """
+    if bar_class is ArrayBar:
+        return None, ArrayBar(None, nedges, __A, __B, __C,
+                              csr=compress_arrays(bar))
+    graph = compress_graph(graph, bar)
+    return graph, bar_class(graph, nedges, __A, __B, __C)
     
     
 def compress_graph(graph, bar):
@@ -120,28 +398,211 @@ def compress_graph(graph, bar):
     return newgraph
     
    
-def shell_game(graph, bar):
+def compress_arrays(bar):
+    """Compresses the graph of an ArrayBar along its bottles, in arrays.
+    
+    Same as compress_graph, with no networkx call.  The compressed graph is
+    filled in dictionaries in the order compress_graph fills its networkx
+    graph, so its nodes and the edges of each node come in the order a Bar
+    of the dict engine goes through them, and both engines make the same
+    moves.
+    
+    Parameters
+    ----------
+    bar : an ArrayBar
+    
+    Returns
+    -------
+    csr : the (nodes, indptr, indices, weights, sizes) of the compressed
+          graph, ready for the csr of the next ArrayBar.  The nodes are the
+          names of the non-empty bottles, the weight of an edge is how many
+          edges it represents, and the edges inside a bottle are a self-loop
+    """
+    compression = bar.nodes_to_bottles()
+    adj = {}
+    for b in set(compression.values()):
+        adj[b] = {}
+    sizes = dict.fromkeys(adj, 0.)
+    
+    nodes = bar.nodes
+    indptr = bar.indptr
+    indices = bar.indices
+    weights = bar.weights
+    for i in xrange(len(nodes)):
+        n = nodes[i]
+        newn = compression[n]
+        sizes[newn] += bar.nsize[i]
+        for index in xrange(indptr[i], indptr[i + 1]):
+            m = nodes[indices[index]]
+            if n >= m:
+                newm = compression[m]
+                weight = weights[index] + adj[newn].get(newm, 0.)
+                adj[newn][newm] = weight
+                adj[newm][newn] = weight
+                
+    newnodes = adj.keys()
+    ids = dict(zip(newnodes, range(len(newnodes))))
+    newindptr = np.zeros(len(newnodes) + 1, dtype=np.int64)
+    newindices = []
+    newweights = []
+    for (i, n) in enumerate(newnodes):
+        newindices.extend([ids[m] for m in adj[n]])
+        newweights.extend(adj[n].values())
+        newindptr[i + 1] = len(newindices)
+    return (newnodes, newindptr, np.array(newindices, dtype=np.int32),
+            np.array(newweights, dtype=np.float64),
+            np.array([sizes[n] for n in newnodes], dtype=np.float64))
+    
+   
+def shell_game(graph, bar, workers=None):
     """ Moves all the nodes of graph around until no improvements can be made
+    
+    If workers is given, bar must be an ArrayBar and the moves are found by
+    parallel_shell_game.  graph may be None for an ArrayBar, which knows
+    its nodes.  Returns whether any node was moved.
     """
+    if workers is not None:
+        return parallel_shell_game(bar, workers)
+        
+    if graph is None:
+        nodes = bar.nodes
+    else:
+        nodes = graph.nodes()
+        
     changed = True
+    moved = False
     lin = bar.lin_metric()
     
     while changed:
         changed = False
         
-        for n in graph.nodes():
+        for n in nodes:
             bhome = bar.bottle_containing(n)
             
             bestneighbor = bar.shift(graph, n)
             if bhome != bestneighbor:
                 bar.swap(graph, n, bhome, bestneighbor)
+                moved = True
                 
         newlin = bar.lin_metric()
         if newlin > lin:
             changed = True
             lin = newlin
             
+    return moved
+            
             
+def parallel_shell_game(bar, workers):
+    """ Moves the nodes of an ArrayBar around as shell_game does, finding the
+    best bottles of the nodes in parallel
+    
+    The nodes are gone through in the order of shell_game.  Once a run of
+    __PARALLEL_MIN nodes has gone by without a move, the best bottles of the
+    next block of nodes are found by the worker processes, against the bar
+    as it is at the start of the block.  Up to the first node of the block
+    that moves these are the bottles shell_game finds, so that node is moved
+    and the sweep goes on in place from the node after it.  The moves are
+    the ones of shell_game, whatever the number of workers, and the workers
+    pay off in the sweeps where few nodes move, such as the last sweeps of
+    every level.
+    
+    Parameters
+    ----------
+    bar : an ArrayBar
+    workers : the number of processes, 1 evaluating the moves in this one
+    
+    Returns
+    -------
+    moved : whether any node was moved
+    """
+    global __shell_shared
+    num_nodes = len(bar.nodes)
+    if workers <= 1 or num_nodes <= __PARALLEL_MIN:
+        return shell_game(None, bar)
+        
+    # the forked workers see the moves through the shared bottle arrays
+    bar.ntob = multiprocessing.RawArray('l', bar.ntob)
+    bar.size = multiprocessing.RawArray('d', bar.size)
+    __shell_shared = bar
+    pool = multiprocessing.Pool(workers)
+    block = workers * __PARALLEL_MIN
+        
+    moved = False
+    try:
+        changed = True
+        lin = bar.lin_metric()
+        while changed:
+            changed = False
+            
+            # the number of nodes gone through in a row without a move
+            still = 0
+            i = 0
+            while i < num_nodes:
+                if still < __PARALLEL_MIN:
+                    n = bar.nodes[i]
+                    bhome = bar.bottle_containing(n)
+                    best = bar.shift(None, n)
+                    i += 1
+                else:
+                    totals = (bar.intedges, bar.idealint)
+                    chunks = np.array_split(
+                                 np.arange(i, min(i + block, num_nodes)),
+                                 workers)
+                    firsts = [f for f in pool.map(__first_move,
+                                                  [(c, totals) for c in chunks])
+                              if f is not None]
+                    if len(firsts) == 0:
+                        i += block
+                        continue
+                    j, best = firsts[0]
+                    n = bar.nodes[j]
+                    bhome = bar.bottle_containing(n)
+                    i = j + 1
+                    
+                if bhome != best:
+                    bar.swap(None, n, bhome, best)
+                    moved = True
+                    still = 0
+                else:
+                    still += 1
+                    
+            newlin = bar.lin_metric()
+            if newlin > lin:
+                changed = True
+                lin = newlin
+    finally:
+        pool.close()
+        pool.join()
+        __shell_shared = None
+        bar.ntob = array.array('l', bar.ntob)
+        bar.size = array.array('d', bar.size)
+    return moved
+        
+        
+# the bar shared with the forked workers of parallel_shell_game
+__shell_shared = None
+
+# the run of nodes without a move after which parallel_shell_game finds the
+# moves in the worker processes
+__PARALLEL_MIN = 1000
+
+
+def __first_move(task):
+    """ Finds the best bottle of the node ids of the task, in order, in the
+    shared bar, given its internal and ideal internal edges, and returns the
+    first (id, bottle) moving its node, or None if none does
+    """
+    ids, totals = task
+    bar = __shell_shared
+    bar.intedges, bar.idealint = totals
+    for i in ids:
+        n = bar.nodes[i]
+        best = bar.shift(None, n, cached=False)
+        if best != bar.bottle_containing(n):
+            return i, best
+    return None
+    
+    
 def clique_game(graph, bar):
     """ Moves the nodes of the graph into maximal cliques
     """
@@ -156,4 +617,192 @@ def clique_game(graph, bar):
             for n in c[1:]:
                 bhome = bar.bottle_containing(n)
                 bestneighbor = bar.bottle_containing(c[0])
-                bar.swap(graph, n, bhome, bestneighbor)
\ No newline at end of file
+                bar.swap(graph, n, bhome, bestneighbor)
+                
+                
+def stream_clique_game(graph, bar, min_size=3, max_size=None):
+    """ Moves the nodes of the graph into cliques, as they are found
+    
+    A streaming version of clique_game, which does not hold all the maximal
+    cliques of the graph at once.  The cliques come from greedy_cliques, so
+    they are disjoint and the largest ones tend to come first.
+    
+    Parameters
+    ----------
+    graph : a networkx graph
+    bar : a Bar or an ArrayBar over the graph
+    min_size, max_size : the bounds on the size of the cliques, see
+                         greedy_cliques
+    """
+    for c in greedy_cliques(graph, min_size, max_size):
+        bestneighbor = bar.bottle_containing(c[0])
+        for n in c[1:]:
+            bhome = bar.bottle_containing(n)
+            bar.swap(graph, n, bhome, bestneighbor)
+            
+            
+def greedy_cliques(graph, min_size=3, max_size=None):
+    """ Generates disjoint cliques of the graph, claiming their nodes greedily
+    
+    The nodes are put in degeneracy order, where every node has at most d
+    neighbours after it, d being the degeneracy of the graph, so every
+    clique is made of its first node and some of its later neighbours.  The
+    largest clique of each node and its unclaimed later neighbours is found
+    by a branch and bound over bitsets of these at most d neighbours.  The
+    nodes wait in a heap by the size of their clique : the clique of the top
+    node is found again, and if no node of it was claimed since, it is
+    yielded and its nodes claimed, else the node goes back in the heap with
+    its new size.  The cliques thus come by decreasing size, as in
+    clique_game, but only the adjacency and one size per node are held,
+    never the list of the cliques.
+    
+    Parameters
+    ----------
+    graph : a networkx graph
+    min_size : the smallest clique yielded
+    max_size : if given, a clique of this size is taken without looking
+               for a larger one
+    
+    Returns
+    -------
+    cliques : a generator of lists of nodes, the first being the node whose
+              later neighbours the clique was found in
+    """
+    nodes, indptr, indices, weights = CD.graph_to_csr(graph)
+    order = degeneracy_order(indptr, indices)
+    position = np.empty(len(nodes), dtype=np.int64)
+    position[order] = np.arange(len(nodes))
+    
+    # keep for every node its neighbours later in the order
+    rows = np.repeat(np.arange(len(nodes)), np.diff(indptr))
+    later = position[indices] > position[rows]
+    later_rows = rows[later]
+    later_cols = indices[later]
+    sort = np.argsort(later_rows, kind='mergesort')
+    later_ptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(later_rows, minlength=len(nodes)),
+              out=later_ptr[1:])
+    later_cols = later_cols[sort].tolist()
+    later_ptr = later_ptr.tolist()
+    
+    claimed = [False] * len(nodes)
+    limit = None
+    if max_size is not None:
+        limit = max_size - 1
+        
+    def clique_of(v):
+        cands = [u for u in later_cols[later_ptr[v]:later_ptr[v + 1]]
+                 if not claimed[u]]
+        if len(cands) + 1 < min_size:
+            return [v]
+            
+        # the adjacency of the candidates, as bitsets of their local ids
+        local = dict(zip(cands, range(len(cands))))
+        masks = [0] * len(cands)
+        for (k, u) in enumerate(cands):
+            for w in later_cols[later_ptr[u]:later_ptr[u + 1]]:
+                if w in local:
+                    masks[k] |= 1 << local[w]
+                    masks[local[w]] |= 1 << k
+                    
+        clique = __max_clique(masks, (1 << len(cands)) - 1, limit)
+        return [v] + [cands[k] for k in clique]
+        
+    heap = []
+    for (p, v) in enumerate(order.tolist()):
+        size = len(clique_of(v))
+        if size >= min_size:
+            heap.append((-size, p, v))
+    heapq.heapify(heap)
+    
+    while len(heap) > 0:
+        (size, p, v) = heapq.heappop(heap)
+        if claimed[v]:
+            continue
+        clique = clique_of(v)
+        if len(clique) < min_size:
+            continue
+        if len(clique) < -size:
+            heapq.heappush(heap, (-len(clique), p, v))
+            continue
+            
+        for u in clique:
+            claimed[u] = True
+        yield [nodes[u] for u in clique]
+            
+            
+def degeneracy_order(indptr, indices):
+    """ Returns the node ids of a CSR graph in degeneracy order
+    
+    Repeatedly takes a node of least degree among the nodes left, with a
+    bucket queue, so every node has at most as many neighbours after it as
+    the degeneracy of the graph.  Self-loops are not counted.
+    """
+    num_nodes = len(indptr) - 1
+    rows = np.repeat(np.arange(num_nodes), np.diff(indptr))
+    degree = np.bincount(rows[rows != indices],
+                         minlength=num_nodes).tolist()
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+    buckets = [set() for d in xrange(max(degree + [0]) + 1)]
+    for (node, d) in enumerate(degree):
+        buckets[d].add(node)
+        
+    order = []
+    done = [False] * num_nodes
+    low = 0
+    for step in xrange(num_nodes):
+        low = max(low - 1, 0)
+        while len(buckets[low]) == 0:
+            low += 1
+        node = buckets[low].pop()
+        done[node] = True
+        order.append(node)
+        for u in indices[indptr[node]:indptr[node + 1]]:
+            if not done[u] and u != node:
+                buckets[degree[u]].remove(u)
+                degree[u] -= 1
+                buckets[degree[u]].add(u)
+                
+    return np.array(order, dtype=np.int64)
+    
+    
+def __max_clique(masks, cands, limit=None):
+    """ Returns the local ids of a largest clique among the bitset cands,
+    masks giving the neighbours of each local id, stopping at limit ids
+    """
+    best = [[]]
+    
+    def expand(clique, cands):
+        if cands == 0:
+            if len(clique) > len(best[0]):
+                best[0] = list(clique)
+            return
+        if len(clique) + bin(cands).count('1') <= len(best[0]):
+            return
+        if limit is not None and len(best[0]) >= limit:
+            return
+            
+        # branch on the candidates not linked to the pivot
+        pivot = max(__bits(cands), key=lambda u: bin(cands & masks[u]).count('1'))
+        for u in __bits(cands & ~masks[pivot]):
+            clique.append(u)
+            expand(clique, cands & masks[u])
+            clique.pop()
+            cands &= ~(1 << u)
+            if len(clique) + bin(cands).count('1') <= len(best[0]):
+                return
+                
+    expand([], cands)
+    return best[0][:limit] if limit is not None else best[0]
+    
+    
+def __bits(mask):
+    """ Returns the positions of the bits set in mask
+    """
+    bits = []
+    while mask:
+        low = mask & -mask
+        bits.append(low.bit_length() - 1)
+        mask ^= low
+    return bits
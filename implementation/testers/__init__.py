@@ -2,5 +2,7 @@
 
 from test_arrangement import *
 from test_cliques import *
+from test_expansion import *
 from test_linearity import *
 from test_load_data import *
+from test_modularity import *
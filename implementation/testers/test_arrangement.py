@@ -65,6 +65,34 @@ def check_bar(b, intedges, extedges, s, idealint):
         print "    pass."
         
     
+def test_array_bar():
+    """Tests the ArrayBar follows the Bar through swaps
+    """
+    
+    print "Testing the ArrayBar Structure"
+    
+    kgraph = CD.karate_club_graph()
+    b = CD.Bar(kgraph, 156, 1., 1., 1.)
+    a = CD.ArrayBar(kgraph, 156, 1., 1., 1.)
+    
+    print "Testing initialization"
+    check_bar(a, b.intedges, b.extedges, b.s, b.idealint)
+    
+    print "Testing swaps"
+    for n in [1, 2, 3, 4, 31]:
+        b.swap(kgraph, n, b.bottle_containing(n), 5)
+        a.swap(kgraph, n, a.bottle_containing(n), 5)
+    check_bar(a, b.intedges, b.extedges, b.s, b.idealint)
+    
+    print "Testing shift"
+    if [a.shift(kgraph, n) for n in kgraph] != \
+       [b.shift(kgraph, n) for n in kgraph]:
+        print "    ***Failed.***"
+    else:
+        print "    pass."
+        
+    
 if __name__ == '__main__':
     test_bottle()
-    test_bar()
\ No newline at end of file
+    test_bar()
+    test_array_bar()
\ No newline at end of file
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+
+import CommunityDetection as CD
+
+def test_degree_index():
+    """ Tests the DegreeIndex shared by the expansions
+    """
+    
+    print "Testing the DegreeIndex on Karate:"
+    kgraph = CD.karate_club_graph()
+    degrees = CD.DegreeIndex(kgraph)
+    same = True
+    for n in kgraph:
+        same = same and degrees[n] == sum([kgraph[n][m]['weight']
+                                           for m in kgraph.neighbors(n)])
+    
+    seed = [1, 2, 3, 4]
+    alone = CD.expand(kgraph, seed, 20)
+    shared = CD.expand(kgraph, seed, 20, degrees=degrees)
+    same = same and alone[0].nodes == shared[0].nodes and alone[2] == shared[2]
+    check(same)
+    
+    print "Testing the DegreeIndex after adding an edge:"
+    kgraph.add_edge(1, 'extra', {'weight':2.})
+    degrees.invalidate([1, 'extra'])
+    check(degrees[1] == sum([kgraph[1][m]['weight']
+                             for m in kgraph.neighbors(1)]))
+        
+        
+def test_outlier():
+    """ Tests the outlier of close from the heaps against going through close
+    """
+    
+    print "Testing the outlier of close on Karate:"
+    kgraph = CD.karate_club_graph()
+    cs = CD.Community()
+    external_nodes = cs.init(kgraph, [1, 2, 3, 4])
+    cand = CD.Candidates(kgraph, external_nodes, cs)
+    cs.init_bounds(cand)
+    cand.rework_fringe()
+    
+    same = True
+    for step in range(15):
+        best, reclassify = cand.get_outlier(cand.close)
+        scan, scan_reclassify = scan_close_outlier(cand)
+        same = same and best == scan \
+               and reclassify.keys() == scan_reclassify.keys()
+            
+        m = cand.get_best()
+        if m is None:
+            break
+        changed = cs.add_node(kgraph, m, cand.fringe)
+        cand.add_connectivity(changed, m)
+        cand.remove_node(m)
+    check(same)
+    
+    print "Testing expand with the outlier of close from going through it:"
+    seeds = [[1, 2, 3, 4], [5, 6, 7], [10, 20], [33]]
+    heaps = [CD.expand(kgraph, seed, 30) for seed in seeds]
+    close_outlier = CD.Candidates.close_outlier
+    CD.Candidates.close_outlier = scan_close_outlier
+    try:
+        scans = [CD.expand(kgraph, seed, 30) for seed in seeds]
+    finally:
+        CD.Candidates.close_outlier = close_outlier
+    check([(heap[0].nodes, heap[2]) for heap in heaps] ==
+          [(scan[0].nodes, scan[2]) for scan in scans])
+    
+    
+def test_bounds():
+    """ Tests the bounds classified in arrays against classifying each node
+    """
+    
+    print "Testing the bounds of a community on Karate:"
+    kgraph = CD.karate_club_graph()
+    cs, cand, order, stat_hist, sd_hist, closure_hist = \
+        CD.expand(kgraph, [1, 2, 3, 4], 20)
+    
+    min_e = len(cs.nodes)
+    min_p = 1.0
+    same = True
+    for n, spec in cs.nodes.iteritems():
+        reason = cs.classification(spec)
+        same = same and reason == spec['reason']
+        if reason == 'e':
+            min_e = min(min_e, int(spec['e']))
+        else:
+            min_p = min(min_p, spec['p'])
+    check(same and cs.bounds == {'min_e':min_e, 'min_p':min_p})
+    
+    
+def test_parallel_expand_all():
+    """ Tests expand_all with worker processes against the sequential one
+    """
+    
+    print "Testing parallel expand_all on Karate:"
+    kgraph = CD.karate_club_graph()
+    seeds = [set([1, 2, 3, 4]), set([33, 34, 9]), set([5, 6, 7, 11])]
+    alone = CD.expand_all(kgraph, seeds, 0, 20, record_history=True)
+    shared = CD.expand_all(kgraph, seeds, 0, 20, workers=2,
+                           record_history=True)
+    same = alone[2:] == shared[2:]
+    for (c1, c2) in zip(alone[0], shared[0]):
+        same = same and c1.nodes == c2.nodes and c1.bounds == c2.bounds
+    check(same)
+    
+    print "Testing expand_all without histories on Karate:"
+    for workers in [None, 2]:
+        (nodes, bounds) = CD.expand_all(kgraph, seeds, 0, 20, workers=workers)
+        same = same and nodes == [set(c.nodes) for c in alone[0]] \
+               and bounds == [c.bounds for c in alone[0]]
+    check(same)
+    
+    
+def scan_close_outlier(cand):
+    """ Finds the outlier of close and the nodes to reclassify going through
+    close, the last pushed of the nodes as far out being the outlier
+    """
+    best = None
+    prob = 0.
+    reclassify = {}
+    for n in sorted(cand.close, key=cand.pushes.get):
+        spec = cand.close[n]
+        if not cand.c.is_candidate(spec):
+            reclassify[n] = spec
+        n_stat = cand.stat_import(spec)
+        n_prob = max(n_stat['e'], n_stat['p'])
+        if n_prob >= prob:
+            best = n
+            prob = n_prob
+    return best, reclassify
+    
+    
+def check(same):
+    if not same:
+        print "    ***Failed.***"
+    else:
+        print "    pass."
+        
+        
+if __name__ == "__main__":
+    
+    test_degree_index()
+    test_outlier()
+    test_bounds()
+    test_parallel_expand_all()
@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 
 import CommunityDetection as CD
+import networkx as nx
+import os
+import random
+import shutil
+import tempfile
 
 
 def test_linearity():
@@ -31,6 +36,213 @@ def test_linearity():
     check_partition(part, 13112)
         
         
+def test_compress_arrays():
+    
+    print "Testing compress_arrays against compress_graph on Karate: "
+    
+    kgraph = CD.karate_club_graph()
+    nedges = 2. * kgraph.number_of_edges()
+    bar = CD.ArrayBar(kgraph, nedges, 1., 1., .01)
+    dict_bar = CD.Bar(kgraph, nedges, 1., 1., .01)
+    CD.clique_game(kgraph, bar)
+    CD.clique_game(kgraph, dict_bar)
+    cgraph = CD.compress_graph(kgraph, dict_bar)
+    nodes, indptr, indices, weights, sizes = CD.compress_arrays(bar)
+    
+    # the nodes and edges come in the order of the graph of the dict engine
+    same = nodes == cgraph.nodes()
+    for (i, n) in enumerate(nodes):
+        row = [(nodes[indices[e]], weights[e])
+               for e in range(indptr[i], indptr[i + 1])]
+        same = same and cgraph.node[n]['size'] == sizes[i] and \
+               row == [(m, cgraph[n][m]['weight']) for m in cgraph[n]]
+    if not same:
+        print "       ***Failed***"
+    else:
+        print "        pass."
+        
+        
+def test_greedy_cliques():
+    
+    print "Testing greedy_cliques gives disjoint cliques on Karate: "
+    
+    kgraph = CD.karate_club_graph()
+    claimed = set()
+    sizes = []
+    valid = True
+    for c in CD.greedy_cliques(kgraph):
+        valid = valid and len(claimed.intersection(c)) == 0 and \
+                all([kgraph.has_edge(n, m) for n in c for m in c if n != m])
+        claimed.update(c)
+        sizes.append(len(c))
+        
+    if not valid or sizes != sorted(sizes, reverse=True) or \
+       sizes[0] != max([len(c) for c in nx.find_cliques(kgraph)]):
+        print "       ***Failed***"
+    else:
+        print "        pass."
+        
+        
+def test_linearity_grid():
+    
+    print "Testing linearity_grid against linearity_run on Karate: "
+    
+    kgraph = CD.karate_club_graph()
+    params = [(0.75, 1., .01), (1., 1., .01)]
+    table = CD.linearity_grid(kgraph, params, workers=2)
+    same = True
+    for (a, b, c, part, I, E, S) in table:
+        run = CD.linearity_run(kgraph, a, b, c, engine="array")
+        same = same and part == run and S == len(set(part.values()))
+        
+    if not same:
+        print "       ***Failed***"
+    else:
+        print "        pass."
+        
+        
+def test_linear_expand_parallel():
+    
+    print "Testing parallel linear_expand against the sequential on Karate: "
+    
+    kgraph = CD.karate_club_graph()
+    part = CD.linearity_run(kgraph, .75, 1., .01)
+    sets = [set(c) for c in CD.part_to_sets(part)]
+    seq = CD.linear_expand(kgraph, [set(c) for c in sets], .75, 1., .01)
+    par = CD.linear_expand(kgraph, [set(c) for c in sets], .75, 1., .01,
+                           workers=2, staleness=1)
+    stale2 = CD.linear_expand(kgraph, [set(c) for c in sets], .75, 1., .01,
+                              workers=2)
+    stale3 = CD.linear_expand(kgraph, [set(c) for c in sets], .75, 1., .01,
+                              workers=3)
+    
+    if seq != par or stale2 != stale3:
+        print "       ***Failed***"
+    else:
+        print "        pass."
+        
+        
+def test_compact_dendogram():
+    
+    print "Testing the compact linearity dendogram on Karate: "
+    
+    kgraph = CD.karate_club_graph()
+    spill = tempfile.mkdtemp()
+    same = True
+    for engine in ["dict", "array"]:
+        dendo = CD.create_dendogram_linear(kgraph.copy(), .75, 1., .01,
+                                           engine)
+        compact = CD.create_dendogram_linear(kgraph.copy(), .75, 1., .01,
+                                             engine, compact=True,
+                                             spill=spill)
+        part = CD.partition_at_level(dendo, len(dendo) - 1)
+        cpart = CD.partition_at_level(compact, len(compact) - 1)
+        same = same and len(dendo) == len(compact) \
+               and sorted(map(sorted, CD.part_to_sets(part))) \
+                   == sorted(map(sorted, CD.part_to_sets(cpart)))
+        try:
+            CD.create_dendogram_linear(kgraph.copy(), .75, 1., .01, engine,
+                                       spill=spill)
+            same = False
+        except ValueError:
+            pass
+            
+        # a run sharing spill leaves the levels of the first one alone
+        CD.create_dendogram_linear(kgraph.copy(), 1., .5, .01, engine,
+                                   compact=True, spill=spill)
+        same = same and cpart == CD.partition_at_level(compact,
+                                                       len(compact) - 1)
+    same = same and os.listdir(spill) == []
+    shutil.rmtree(spill)
+    
+    if not same:
+        print "       ***Failed***"
+    else:
+        print "        pass."
+        
+        
+def test_engines():
+    
+    print "Testing the dict and array engines agree on a planted graph: "
+    
+    graph = planted_graph(30, 40, .3, .01, 2)
+    same = True
+    for (a, b, c) in [(1., 1., .01), (.75, 1., .01)]:
+        dendo = CD.create_dendogram_linear(graph.copy(), a, b, c, "dict")
+        same = same and len(dendo) > 3 \
+               and CD.linearity_run(graph, a, b, c, engine="dict") \
+                   == CD.linearity_run(graph, a, b, c, engine="array")
+        
+    if not same:
+        print "       ***Failed***"
+    else:
+        print "        pass."
+        
+        
+def test_continuation():
+    
+    print "Testing continuation gives the levels of the stepped b: "
+    
+    graph = planted_graph(20, 30, .3, .02, 3)
+    same = True
+    for engine in ["dict", "array"]:
+        levels = [CD.create_dendogram_linear(graph.copy(), 1., 1., .01, engine,
+                                             continuation=continuation)
+                  for continuation in [False, True]]
+        same = same and levels[0] == levels[1]
+        
+    if not same:
+        print "       ***Failed***"
+    else:
+        print "        pass."
+        
+        
+def test_parallel_shell_game():
+    
+    print "Testing the parallel shell game against the sequential one: "
+    
+    graph = planted_graph(20, 30, .3, .02, 4)
+    lp = CD.linearity_partition
+    parallel_min = lp.__PARALLEL_MIN
+    # lowered so that the moves are actually found by the pool
+    lp.__PARALLEL_MIN = 20
+    try:
+        same = True
+        for (a, b, c) in [(1., 1., .01), (.75, 1., .01)]:
+            base = CD.linearity_run(graph, a, b, c, engine="array")
+            base_lin = CD.partition_lin_metric(graph, base, a, b, c)
+            for workers in [2, 3]:
+                part = CD.linearity_run(graph, a, b, c, engine="array",
+                                        workers=workers)
+                lin = CD.partition_lin_metric(graph, part, a, b, c)
+                same = same and part == base \
+                       and abs(lin - base_lin) <= .05 * abs(base_lin)
+    finally:
+        lp.__PARALLEL_MIN = parallel_min
+        
+    if not same:
+        print "       ***Failed***"
+    else:
+        print "        pass."
+        
+        
+def planted_graph(groups, size, pin, pout, seed):
+    """ Returns a graph of groups of size nodes, two nodes being linked with
+    probability pin in a group and pout across groups
+    """
+    rand = random.Random(seed)
+    graph = nx.Graph()
+    graph.add_nodes_from(range(groups * size), size=1.)
+    for u in xrange(groups * size):
+        for v in xrange(u + 1, groups * size):
+            p = pout
+            if u / size == v / size:
+                p = pin
+            if rand.random() < p:
+                graph.add_edge(u, v, weight=1.)
+    return graph
+    
+    
 def check_partition(part, size):
     if len(set(part.values())) != size:
         print "       ***Failed***:"
@@ -54,4 +266,12 @@ def check_bar(bar, s, base, lin):
         
 if __name__ == "__main__":
     
-    test_linearity()
\ No newline at end of file
+    test_linearity()
+    test_compress_arrays()
+    test_greedy_cliques()
+    test_linearity_grid()
+    test_linear_expand_parallel()
+    test_compact_dendogram()
+    test_engines()
+    test_continuation()
+    test_parallel_shell_game()
\ No newline at end of file
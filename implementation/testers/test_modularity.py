@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+import CommunityDetection as CD
+import networkx as nx
+import os
+import shutil
+import tempfile
+
+
+def test_csr_engine():
+    """ Tests the CSR engine of Louvain against the dict one
+    """
+    
+    print "Testing the CSR Louvain engine."
+    
+    print "Testing on Karate Club:"
+    kgraph = CD.karate_club_graph()
+    check_engines(kgraph)
+    
+    print "Testing on a random graph with a self loop:"
+    rgraph = nx.erdos_renyi_graph(500, 0.01, seed=7)
+    rgraph.add_edge(0, 0)
+    check_engines(rgraph)
+    
+    print "Testing from an initial partition:"
+    part = dict([(n, n % 3) for n in rgraph])
+    check_engines(rgraph, part)
+    
+    
+def check_engines(graph, part=None, tolerance=0.02):
+    """ Checks both engines give a well formed dendogram of close modularity
+    """
+    dendo = CD.generate_dendogram(graph, part)
+    csr_dendo = CD.generate_dendogram_csr(graph, part)
+    modularity = CD.modularity_communities.modularity
+    mod = modularity(CD.partition_at_level(dendo, len(dendo) - 1), graph)
+    csr_part = CD.partition_at_level(csr_dendo, len(csr_dendo) - 1)
+    csr_mod = modularity(csr_part, graph)
+    
+    if set(csr_part.keys()) != set(graph.nodes()) or \
+       abs(mod - csr_mod) > tolerance:
+        print "    ***Failed.***"
+        print "    dict modularity:", mod, " csr modularity:", csr_mod
+    else:
+        print "    pass."
+        
+
+def test_parallel_levels():
+    """ Tests the levels of the parallel moves never lose modularity
+    """
+    
+    print "Testing the modularity of the parallel levels."
+    
+    rgraph = nx.erdos_renyi_graph(2000, 0.004, seed=1)
+    modularity = CD.modularity_communities.modularity
+    failed = False
+    for pruned in [False, True]:
+        dendo = CD.generate_dendogram_csr(rgraph, workers=1, pruned=pruned)
+        mods = [modularity(CD.partition_at_level(dendo, level), rgraph)
+                for level in range(len(dendo))]
+        failed = failed or mods != sorted(mods)
+        
+    if failed:
+        print "    ***Failed.***"
+        print "    modularities:", mods
+    else:
+        print "    pass."
+        
+        
+def test_save_dendogram():
+    """ Tests a dendogram with mixed labels is read back as it was saved
+    """
+    
+    print "Testing saving and loading a dendogram."
+    
+    graph = nx.path_graph(6)
+    graph = nx.relabel_nodes(graph, {0:'a', 1:(1, 2), 2:'3', 3:3, 4:4.5, 5:5})
+    dendo = CD.generate_dendogram_csr(graph, compact=True)
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, "dendo.npz")
+    dendo.save(filename)
+    loaded = CD.load_dendogram(filename)
+    shutil.rmtree(directory)
+    
+    last = len(dendo) - 1
+    if loaded.nodes != dendo.nodes or \
+       [type(node) for node in loaded.nodes] != \
+       [type(node) for node in dendo.nodes] or \
+       loaded.partition_at_level(last) != dendo.partition_at_level(last):
+        print "    ***Failed.***"
+        print "    nodes:", loaded.nodes
+    else:
+        print "    pass."
+        
+        
+def test_induced_graph():
+    """ Tests induced_graph sums the weights and keeps their type
+    """
+    
+    print "Testing the induced graph."
+    
+    n = 5
+    graph = nx.complete_graph(2 * n)
+    part = dict([(node, node % 2) for node in graph])
+    ind = CD.induced_graph(part, graph)
+    weights = [(u, v, d['weight']) for (u, v, d) in ind.edges(data=True)]
+    ints = all([isinstance(w, int) for (u, v, w) in weights])
+    
+    for (u, v) in graph.edges():
+        graph[u][v]['weight'] = 0.5
+    ind = CD.induced_graph(part, graph)
+    floats = all([isinstance(d['weight'], float)
+                  for (u, v, d) in ind.edges(data=True)])
+    
+    if sorted(weights) != [(0, 0, n * (n - 1) / 2), (0, 1, n * n),
+                           (1, 1, n * (n - 1) / 2)] or not ints or not floats:
+        print "    ***Failed.***"
+        print "    weights:", weights
+    else:
+        print "    pass."
+        
+        
+def test_resolution_sweep():
+    """ Tests the table of resolution_sweep against the partitions it holds
+    """
+    
+    print "Testing the resolution sweep."
+    
+    rgraph = nx.erdos_renyi_graph(500, 0.01, seed=7)
+    modularity = CD.modularity_communities.modularity
+    table = CD.resolution_sweep(rgraph, [2., 0.5, 1.])
+    resolutions = [row[0] for row in table]
+    failed = resolutions != [0.5, 1., 2.]
+    for resolution, part, mod, num in table:
+        if set(part.keys()) != set(rgraph.nodes()) or \
+           abs(modularity(part, rgraph) - mod) > 0.000001 or \
+           len(set(part.values())) != num:
+            failed = True
+            
+    if failed:
+        print "    ***Failed.***"
+        print "    table:", [(row[0], row[2], row[3]) for row in table]
+    else:
+        print "    pass."
+        
+        
+def test_consensus():
+    """ Tests the consensus partition is complete and reproducible
+    """
+    
+    print "Testing the consensus partition."
+    
+    rgraph = nx.erdos_renyi_graph(300, 0.02, seed=7)
+    part = CD.consensus_partition(rgraph, runs=5, seed=1)
+    parallel_part = CD.consensus_partition(rgraph, runs=5, workers=2, seed=1)
+    
+    if set(part.keys()) != set(rgraph.nodes()) or part != parallel_part:
+        print "    ***Failed.***"
+    else:
+        print "    pass."
+        
+        
+if __name__ == '__main__':
+    test_csr_engine()
+    test_induced_graph()
+    test_save_dendogram()
+    test_parallel_levels()
+    test_resolution_sweep()
+    test_consensus()